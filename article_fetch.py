@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from bs4 import BeautifulSoup
+import threading
+import os
+import instrumentation
+from http_session import make_session
+
+# Article pages are downloaded concurrently over one pooled session, and their text is
+# extracted on the download threads or, for large pages, on a process pool since HTML
+# parsing is CPU-bound. Kept apart from news_fetch so the extraction workers stay light.
+DOWNLOAD_WORKERS = int(os.getenv('NEWS_DOWNLOAD_WORKERS', 8))
+# With NEWS_EXTRACT_WORKERS > 1 extraction moves to that many worker processes
+EXTRACT_WORKERS = int(os.getenv('NEWS_EXTRACT_WORKERS', 1))
+REQUEST_TIMEOUT = float(os.getenv('NEWS_REQUEST_TIMEOUT', 10))
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+
+_session = None
+_session_lock = threading.Lock()
+
+# Shared HTTP session with a connection pool sized for the download workers and retries on transient errors
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session(DOWNLOAD_WORKERS, {'User-Agent': USER_AGENT})
+        return _session
+
+# Download an article page, as a conditional request if validators from an earlier download are given.
+# Returns a dict with the HTML ('content', None if the page was not modified) and the page validators.
+@instrumentation.timed('fetch', source='article')
+def download_article(url, etag=None, last_modified=None):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    not_modified = response.status_code == 304
+    return {
+        'content': None if not_modified else response.content,
+        'not_modified': not_modified,
+        'etag': response.headers.get('ETag', etag),
+        'last_modified': response.headers.get('Last-Modified', last_modified),
+    }
+
+# Extract the paragraph text of an article page
+@instrumentation.timed('extract')
+def extract_text(html):
+    soup = BeautifulSoup(html, 'lxml')
+    paragraphs = soup.find_all('p')
+    return ' '.join([para.get_text() for para in paragraphs])
+
+# Download a page and extract its text on the calling thread
+def _fetch_article(url, etag=None, last_modified=None):
+    page = download_article(url, etag, last_modified)
+    page['text'] = extract_text(page.pop('content')) if not page['not_modified'] else None
+    return page
+
+# Download and extract many articles, conditionally where validators (a list of
+# (etag, last_modified) pairs) are given. Returns one entry per URL: either the exception
+# raised while fetching it, or a dict with 'text' (None if the page was not modified),
+# 'not_modified', 'etag' and 'last_modified'. Each page is handed to the extraction pool as
+# soon as its download completes; with EXTRACT_WORKERS <= 1 it is extracted on the download thread.
+def fetch_articles(urls, validators=None):
+    validators = validators or [(None, None)] * len(urls)
+    results = [None] * len(urls)
+    if EXTRACT_WORKERS <= 1:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloads:
+            futures = [downloads.submit(_fetch_article, url, *validator) for url, validator in zip(urls, validators)]
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = e
+        return results
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloads, ProcessPoolExecutor(max_workers=EXTRACT_WORKERS) as extractors:
+        download_futures = {downloads.submit(download_article, url, *validator): i for i, (url, validator) in enumerate(zip(urls, validators))}
+        extract_futures = {}
+        for future in as_completed(download_futures):
+            i = download_futures[future]
+            try:
+                page = future.result()
+            except Exception as e:
+                results[i] = e
+                continue
+            content = page.pop('content')
+            page['text'] = None
+            results[i] = page
+            if content is not None:
+                extract_futures[extractors.submit(extract_text, content)] = i
+        for future, i in extract_futures.items():
+            try:
+                results[i]['text'] = future.result()
+            except Exception as e:
+                results[i] = e
+    return results
@@ -0,0 +1,133 @@
+from functools import lru_cache
+import numpy as np
+from optimized_models import INFERENCE_BACKEND, optimize_ctc_model
+import threading
+import os
+import instrumentation
+
+# torch, torchaudio and transformers are imported on first use
+
+ASR_MODEL = os.getenv('ASR_MODEL', 'facebook/wav2vec2-base-960h')
+SAMPLE_RATE = 16000
+# Long audio is transcribed in CHUNK_SECONDS pieces with STRIDE_SECONDS of context on each
+# side, which is discarded after inference so words are not cut at chunk edges
+CHUNK_SECONDS = 20
+STRIDE_SECONDS = 2
+
+# One resampler per input rate, shared by all calls
+@lru_cache(maxsize=None)
+def get_resampler(sample_rate):
+    import torchaudio
+
+    return torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=SAMPLE_RATE)
+
+# Load an audio file as a mono 16 kHz float waveform
+def load_audio(audio_path):
+    import torchaudio
+
+    waveform, sample_rate = torchaudio.load(audio_path)
+    waveform = waveform.mean(dim=0)
+    if sample_rate != SAMPLE_RATE:
+        waveform = get_resampler(sample_rate)(waveform)
+    return waveform.numpy()
+
+# Offline speech recognizer around a Wav2Vec2 CTC model. The model is loaded on first use, and
+# clips are transcribed in padded batches under torch.inference_mode().
+class Wav2Vec2Engine:
+    def __init__(self, model_name=ASR_MODEL, batch_size=8, backend=INFERENCE_BACKEND):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend
+        self._processor = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+                self._processor = Wav2Vec2Processor.from_pretrained(self.model_name)
+                model = Wav2Vec2ForCTC.from_pretrained(self.model_name)
+                model.eval()
+                self._model = optimize_ctc_model(model, self.model_name, self.backend)
+        return self
+
+    # Logits of a batch of variable-length 16 kHz waveforms, padded to the longest one
+    def _logits(self, waveforms):
+        import torch
+
+        self.load()
+        inputs = self._processor([np.asarray(waveform, dtype=np.float32) for waveform in waveforms],
+                                 sampling_rate=SAMPLE_RATE, padding=True, return_tensors="pt",
+                                 return_attention_mask=True)
+        # Checkpoints trained without attention masks (like wav2vec2-base) expect plain zero padding
+        kwargs = {}
+        if self._processor.feature_extractor.return_attention_mask:
+            kwargs['attention_mask'] = inputs.attention_mask
+        with torch.inference_mode(), instrumentation.span('inference', model='wav2vec2', backend=self.backend):
+            return self._model(inputs.input_values, **kwargs).logits
+
+    # Transcribe a list of 16 kHz waveforms. Clips are batched in order of length to keep
+    # padding small; clips longer than one chunk are transcribed in chunked mode.
+    def transcribe_batch(self, waveforms):
+        import torch
+
+        transcriptions = [None] * len(waveforms)
+        short = []
+        for index, waveform in enumerate(waveforms):
+            if len(waveform) > (CHUNK_SECONDS + 2 * STRIDE_SECONDS) * SAMPLE_RATE:
+                transcriptions[index] = self.transcribe_long(waveform)
+            else:
+                short.append(index)
+        short.sort(key=lambda index: len(waveforms[index]))
+        for start in range(0, len(short), self.batch_size):
+            batch = short[start:start + self.batch_size]
+            predicted_ids = torch.argmax(self._logits([waveforms[index] for index in batch]), dim=-1)
+            for index, text in zip(batch, self._processor.batch_decode(predicted_ids)):
+                transcriptions[index] = text.lower()
+        return transcriptions
+
+    def transcribe(self, waveform):
+        return self.transcribe_batch([waveform])[0]
+
+    def transcribe_file(self, audio_path):
+        return self.transcribe(load_audio(audio_path))
+
+    # Transcribe a speech_recognition AudioData captured from the microphone
+    def transcribe_audio_data(self, audio):
+        raw = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+        return self.transcribe(np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0)
+
+    # Predicted token ids of consecutive chunks of a long waveform, with the strides trimmed off
+    def _chunk_ids(self, waveform, chunk_seconds=CHUNK_SECONDS, stride_seconds=STRIDE_SECONDS):
+        import torch
+
+        chunk, stride = chunk_seconds * SAMPLE_RATE, stride_seconds * SAMPLE_RATE
+        starts = list(range(0, len(waveform), chunk))
+        for first in range(0, len(starts), self.batch_size):
+            batch_starts = starts[first:first + self.batch_size]
+            pieces = [waveform[max(0, start - stride):start + chunk + stride] for start in batch_starts]
+            predicted_ids = torch.argmax(self._logits(pieces), dim=-1)
+            # Samples per output frame of the convolutional feature encoder
+            ratio = int(np.prod(self._model.config.conv_stride))
+            for start, ids in zip(batch_starts, predicted_ids):
+                left = int(round((start - max(0, start - stride)) / ratio))
+                right = int(round(min(chunk, len(waveform) - start) / ratio))
+                yield ids[left:left + right]
+
+    # Transcribe a long waveform chunk by chunk, yielding the transcript so far after each chunk
+    def stream(self, waveform, chunk_seconds=CHUNK_SECONDS, stride_seconds=STRIDE_SECONDS):
+        import torch
+
+        ids = []
+        for chunk_ids in self._chunk_ids(waveform, chunk_seconds, stride_seconds):
+            ids.append(chunk_ids)
+            yield self._processor.decode(torch.cat(ids)).lower()
+
+    # Transcribe a long waveform in chunks, decoding once at the end
+    def transcribe_long(self, waveform, chunk_seconds=CHUNK_SECONDS, stride_seconds=STRIDE_SECONDS):
+        import torch
+
+        ids = list(self._chunk_ids(waveform, chunk_seconds, stride_seconds))
+        return self._processor.decode(torch.cat(ids)).lower() if ids else ""
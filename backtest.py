@@ -0,0 +1,182 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import numpy as np
+import argparse
+import logging
+import json
+import time
+import os
+import history_store
+import price_pred
+import fast_forecast
+from forecast_scheduler import limit_blas_threads, FORECAST_WORKERS, BLAS_THREADS
+from watchlist import load_watchlist, WATCHLIST_PATH
+
+logger = logging.getLogger(__name__)
+
+# Rolling-origin backtest of the forecasting models on the stored history only (no network).
+# Each company is evaluated at several cutoffs: the model is fitted on the closes up to the
+# cutoff and scored on the following `horizon` days. Companies run in parallel on a process
+# pool, and the results are written as a JSON report that can be compared with an earlier one.
+BACKTEST_MODELS = fast_forecast.FAST_MODELS + ('autoarima',)
+BACKTEST_FOLDS = 5
+BACKTEST_HORIZON = 10
+BACKTEST_STEP = 20
+METRICS = ('mape', 'rmse', 'mae')
+reports_folder = 'reports'
+
+# Fit a model on the training closes and forecast the next `horizon` days
+def fit_predict(model, y_train, horizon):
+    if model == 'autoarima':
+        forecaster = price_pred.full_search(y_train)
+        return np.asarray(forecaster.predict(fh=list(range(1, horizon + 1)))).ravel()
+    return fast_forecast.FORECASTERS[model](y_train.to_numpy()[:, None], horizon)[:, 0]
+
+def errors(y_true, y_pred):
+    residuals = y_true - y_pred
+    return {
+        'mape': float(np.mean(np.abs(residuals) / np.abs(y_true))),
+        'rmse': float(np.sqrt(np.mean(residuals ** 2))),
+        'mae': float(np.mean(np.abs(residuals))),
+    }
+
+# Cutoffs (number of training rows) of the folds, the last one leaving exactly `horizon` test days
+def cutoffs(length, folds, horizon, step):
+    return [length - horizon - i * step for i in reversed(range(folds)) if length - horizon - i * step > 2 * horizon]
+
+# Evaluate every model on every fold of one company:
+# {model: {'folds': [...], 'failures': n, 'errors': ["<cutoff>: <error>", ...]}}
+def backtest_company(company, models, folds, horizon, step):
+    y = price_pred.load_close_series(company).dropna()
+    results = {model: {'folds': [], 'failures': 0, 'errors': []} for model in models}
+    for cutoff in cutoffs(len(y), folds, horizon, step):
+        y_train, y_test = y.iloc[:cutoff], y.iloc[cutoff:cutoff + horizon].to_numpy()
+        cutoff_date = y.index[cutoff - 1].strftime("%Y-%m-%d")
+        for model in models:
+            start = time.perf_counter()
+            try:
+                y_pred = fit_predict(model, y_train, horizon)
+            except Exception as e:
+                logger.error(f"Backtest of {model} on {company} at {cutoff_date} failed: {e}")
+                results[model]['failures'] += 1
+                results[model]['errors'].append(f"{cutoff_date}: {type(e).__name__}: {e}")
+                continue
+            fold = errors(y_test, y_pred)
+            fold['fit_seconds'] = time.perf_counter() - start
+            fold['cutoff'] = cutoff_date
+            results[model]['folds'].append(fold)
+    return results
+
+# Mean of each metric and of the fit time over a list of folds
+def summarize(folds):
+    if not folds:
+        return None
+    return {key: float(np.mean([fold[key] for fold in folds])) for key in METRICS + ('fit_seconds',)}
+
+def run_backtest(companies, models=BACKTEST_MODELS, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON, step=BACKTEST_STEP,
+                 workers=FORECAST_WORKERS, blas_threads=BLAS_THREADS):
+    per_company = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=limit_blas_threads, initargs=(blas_threads,)) as executor:
+        futures = {executor.submit(backtest_company, company, models, folds, horizon, step): company for company in companies}
+        for future in as_completed(futures):
+            company = futures[future]
+            try:
+                per_company[company] = future.result()
+            except Exception as e:
+                print(f"Backtest of {company} failed: {e}")
+                continue
+            print(f"Backtested {company} ({len(per_company)}/{len(companies)})")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'settings': {'models': list(models), 'folds': folds, 'horizon': horizon, 'step': step, 'companies': sorted(per_company)},
+        'wall_seconds': time.perf_counter() - started,
+        'models': {},
+        'companies': {},
+        # Why folds failed: {company: {model: ["<cutoff>: <error>", ...]}}
+        'errors': {},
+    }
+    for model in models:
+        all_folds = [fold for results in per_company.values() for fold in results[model]['folds']]
+        summary = summarize(all_folds)
+        if summary is not None:
+            summary['folds'] = len(all_folds)
+            summary['failures'] = sum(results[model]['failures'] for results in per_company.values())
+        report['models'][model] = summary
+    for company, results in sorted(per_company.items()):
+        report['companies'][company] = {model: summarize(results[model]['folds']) for model in models}
+        failed = {model: results[model]['errors'] for model in models if results[model]['errors']}
+        if failed:
+            report['errors'][company] = failed
+    return report
+
+# Differences between two reports per model. A model regresses when an error metric grows by
+# more than `tolerance` (relative), or its fit time by more than `time_tolerance`.
+def compare_reports(previous, current, tolerance=0.05, time_tolerance=0.25):
+    rows, regressions = [], []
+    for model, summary in current['models'].items():
+        before = previous.get('models', {}).get(model)
+        if summary is None or before is None:
+            continue
+        for key in METRICS + ('fit_seconds',):
+            change = (summary[key] - before[key]) / before[key] if before[key] else 0.0
+            rows.append((model, key, before[key], summary[key], change))
+            if change > (time_tolerance if key == 'fit_seconds' else tolerance):
+                regressions.append(f"{model} {key} {before[key]:.4g} -> {summary[key]:.4g} ({100 * change:+.1f}%)")
+    return rows, regressions
+
+def print_report(report):
+    print(f"{'model':12s} {'MAPE':>8s} {'RMSE':>10s} {'MAE':>10s} {'fit ms':>10s} {'folds':>6s}")
+    for model, summary in report['models'].items():
+        if summary is None:
+            failures = [error for failed in report.get('errors', {}).values() for error in failed.get(model, [])]
+            print(f"{model:12s} no successful folds" + (f" ({len(failures)} failed, e.g. {failures[0]})" if failures else ""))
+            continue
+        print(f"{model:12s} {summary['mape']:8.4f} {summary['rmse']:10.4f} {summary['mae']:10.4f} "
+              f"{1000 * summary['fit_seconds']:10.2f} {summary['folds']:6d}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the forecasting models on the stored history")
+    parser.add_argument('--watchlist', default=WATCHLIST_PATH)
+    parser.add_argument('--companies', nargs='*', help="companies to evaluate (default: the watchlist)")
+    parser.add_argument('--models', nargs='*', default=list(BACKTEST_MODELS), choices=BACKTEST_MODELS)
+    parser.add_argument('--folds', type=int, default=BACKTEST_FOLDS)
+    parser.add_argument('--horizon', type=int, default=BACKTEST_HORIZON)
+    parser.add_argument('--step', type=int, default=BACKTEST_STEP, help="business days between cutoffs")
+    parser.add_argument('--workers', type=int, default=FORECAST_WORKERS)
+    parser.add_argument('--output', help="report path (default: reports/backtest-<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier report to compare against; exits with status 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="allowed relative growth of the error metrics")
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help="allowed relative growth of the fit time")
+    args = parser.parse_args()
+
+    companies = args.companies or list(load_watchlist(args.watchlist))
+    companies = [company for company in companies if os.path.exists(history_store.history_path(company))]
+    if not companies:
+        print("No stored history to backtest. Run price_pred.py first.")
+        return
+
+    report = run_backtest(companies, tuple(args.models), args.folds, args.horizon, args.step, args.workers)
+    print_report(report)
+
+    output = args.output or os.path.join(reports_folder, f"backtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            previous = json.load(file)
+        rows, regressions = compare_reports(previous, report, args.tolerance, args.time_tolerance)
+        for model, key, before, after, change in rows:
+            print(f"{model:12s} {key:12s} {before:12.4g} -> {after:12.4g} ({100 * change:+.1f}%)")
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import statistics
+import argparse
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from intent_parser import IntentParser
+
+# The assistant's own watchlist; the synthetic companies are added to it
+WATCHLIST = {
+    "Google": "GOOGL",
+    "Apple": "AAPL",
+    "Microsoft": "MSFT",
+    "Amazon": "AMZN",
+    "Facebook": "META",
+    "Tesla": "TSLA",
+    "Netflix": "NFLX",
+}
+
+# Transcripts as they come back from the recognizers, including misrecognized names
+TRANSCRIPTS = [
+    "what is the price of apple",
+    "what's the price of apple and tesla",
+    "predict the price of microsoft",
+    "give me the news",
+    "elaborate on interest rates",
+    "how is my portfolio doing",
+    "price of netflx",
+    "what is the google stock price",
+    "predict amazon and facebook",
+    "thank you",
+    "what is the a a p l price",
+    "what is the day range of tesla",
+    "how much volume did apple trade",
+    "tell me about the weather",
+]
+
+SYLLABLES = ['ka', 'lo', 'mi', 'tra', 'zen', 'vo', 'rex', 'sol', 'dyn', 'qu', 'ar', 'tek', 'nor', 'bi', 'ux']
+
+# Random pronounceable company names with unique tickers
+def synthetic_watchlist(size, seed=0):
+    rng = random.Random(seed)
+    companies = {}
+    while len(companies) < size:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.3:
+            name += ' ' + rng.choice(['Holdings', 'Systems', 'Energy', 'Bank', 'Labs'])
+        ticker = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.randint(3, 5)))
+        if name not in companies and ticker not in companies.values():
+            companies[name] = ticker
+    return companies
+
+# The chained substring checks the parser replaced, kept as the baseline
+def substring_scan(command, company_symbols):
+    if "thank you" in command:
+        return 'thanks', []
+    if "news" in command:
+        return 'news', []
+    if "elaborate" in command:
+        return 'elaborate', []
+    if "portfolio" in command:
+        return 'portfolio', []
+    for company, symbol in company_symbols.items():
+        if company.lower() in command:
+            if "price" in command:
+                return 'price', [(company, symbol)]
+            if "predict" in command:
+                return 'predict', [(company, symbol)]
+            return 'unknown', []
+    return 'unknown', []
+
+# Median seconds per command over the corpus
+def time_per_command(function, transcripts, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for transcript in transcripts:
+            function(transcript)
+        timings.append((time.perf_counter() - start) / len(transcripts))
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent parsing cost against a large synthetic watchlist")
+    parser.add_argument('--corpus', help="file with one transcript per line (default: built-in transcripts)")
+    parser.add_argument('--watchlist', type=int, nargs='+', default=[7, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, 'r') as file:
+            transcripts = [line.strip().lower() for line in file if line.strip()]
+    else:
+        transcripts = TRANSCRIPTS
+
+    for size in args.watchlist:
+        company_symbols = dict(WATCHLIST)
+        company_symbols.update(synthetic_watchlist(max(0, size - len(WATCHLIST))))
+
+        start = time.perf_counter()
+        intent_parser = IntentParser(company_symbols)
+        build_time = time.perf_counter() - start
+
+        parse_time = time_per_command(intent_parser.parse, transcripts, args.repeat)
+        scan_time = time_per_command(lambda command: substring_scan(command, company_symbols), transcripts, args.repeat)
+        print(f"{len(company_symbols):6d} companies   build {1000 * build_time:8.1f} ms   "
+              f"parse {1e6 * parse_time:8.1f} us/command   substring scan {1e6 * scan_time:8.1f} us/command")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import statistics
+import subprocess
+import argparse
+import sys
+import os
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# What each entry point has to do before it can start working
+SCENARIOS = {
+    'import news_fetch': "import news_fetch",
+    'import price_pred': "import price_pred",
+    'import main_assistant': "import main_assistant",
+    'import custom_voice': "import custom_voice",
+    'load summarizer': "import news_fetch; news_fetch.get_summarizer()",
+    'load wav2vec2': "import asr_engine; asr_engine.Wav2Vec2Engine().load()",
+}
+
+# Wall time of a fresh interpreter running a snippet, in seconds
+def time_snippet(snippet):
+    code = f"import time; start = time.perf_counter(); {snippet}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the scripts and their models")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS), help=f"any of: {', '.join(SCENARIOS)}")
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        try:
+            timings = [time_snippet(SCENARIOS[name]) for _ in range(args.repeat)]
+            print(f"{name:24s} median {1000 * statistics.median(timings):8.0f} ms   min {1000 * min(timings):8.0f} ms")
+        except RuntimeError as e:
+            print(f"{name:24s} failed: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import numpy as np
+import argparse
+import glob
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wake_word
+
+CHUNK = 1024
+
+# Stream a clip through a fresh detector the way the microphone would deliver it.
+# Returns (detection times in seconds of audio, CPU seconds spent).
+def run_clip(templates, samples, sample_rate, threshold):
+    detector = wake_word.WakeWordDetector(templates, threshold=threshold)
+    pcm = np.clip(samples, -32768, 32767).astype(np.int16)
+    detections = []
+    start = time.process_time()
+    for offset in range(0, len(pcm), CHUNK):
+        if detector.process(pcm[offset:offset + CHUNK].tobytes(), sample_rate, 2):
+            detections.append((offset + CHUNK) / sample_rate)
+    return detections, time.process_time() - start
+
+# End of the spoken keyword in a positive clip: the last frame louder than the detector's energy gate
+def keyword_end(samples, sample_rate):
+    features = wake_word.FeatureStream()
+    _, energies = features.process(samples, sample_rate)
+    loud = np.nonzero(energies >= wake_word.WAKE_WORD_MIN_ENERGY)[0]
+    return (loud[-1] + 1) * wake_word.HOP_LENGTH / wake_word.SAMPLE_RATE if len(loud) else len(samples) / sample_rate
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost and latency of the local wake-word detector on WAV fixtures")
+    parser.add_argument('fixtures', help="directory with positive/*.wav (clips ending with the wake phrase) and negative/*.wav")
+    parser.add_argument('--templates', default=wake_word.WAKE_WORD_TEMPLATES)
+    parser.add_argument('--threshold', type=float, default=wake_word.WAKE_WORD_THRESHOLD)
+    args = parser.parse_args()
+
+    templates = wake_word.load_templates(args.templates)
+    if not templates:
+        parser.error(f"no templates found in {args.templates}")
+
+    audio_seconds, cpu_seconds = 0.0, 0.0
+    latencies, missed, false_alarms, negative_seconds = [], [], 0, 0.0
+    for kind in ('positive', 'negative'):
+        for path in sorted(glob.glob(os.path.join(args.fixtures, kind, '*.wav'))):
+            samples, sample_rate = wake_word.read_wav(path)
+            detections, cpu = run_clip(templates, samples, sample_rate, args.threshold)
+            duration = len(samples) / sample_rate
+            audio_seconds += duration
+            cpu_seconds += cpu
+            if kind == 'positive':
+                if detections:
+                    latencies.append(detections[0] - keyword_end(samples, sample_rate))
+                else:
+                    missed.append(os.path.basename(path))
+            else:
+                false_alarms += len(detections)
+                negative_seconds += duration
+
+    print(f"Audio processed:      {audio_seconds:.1f} s")
+    print(f"CPU per audio second: {1000 * cpu_seconds / max(audio_seconds, 1e-9):.2f} ms")
+    if latencies or missed:
+        print(f"Detected:             {len(latencies)}/{len(latencies) + len(missed)}")
+    if latencies:
+        print(f"Detection latency:    mean {1000 * np.mean(latencies):.0f} ms, max {1000 * np.max(latencies):.0f} ms")
+    if missed:
+        print(f"Missed:               {', '.join(missed)}")
+    if negative_seconds:
+        print(f"False alarms:         {false_alarms} ({3600 * false_alarms / negative_seconds:.1f} per hour)")
+
+if __name__ == "__main__":
+    main()
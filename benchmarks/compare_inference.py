@@ -0,0 +1,129 @@
+import numpy as np
+import argparse
+import glob
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from optimized_models import BACKENDS
+
+# Length of the longest common subsequence of two token lists
+def lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for token in a:
+        previous = 0
+        for j, other in enumerate(b):
+            current = row[j + 1]
+            row[j + 1] = previous + 1 if token == other else max(row[j + 1], row[j])
+            previous = current
+    return row[-1]
+
+def f_score(overlap, candidate_length, reference_length):
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / candidate_length, overlap / reference_length
+    return 2 * precision * recall / (precision + recall)
+
+# ROUGE-1 and ROUGE-L F-scores of a candidate summary against a reference
+def rouge(candidate, reference):
+    candidate, reference = candidate.lower().split(), reference.lower().split()
+    counts = {}
+    for token in reference:
+        counts[token] = counts.get(token, 0) + 1
+    unigram_overlap = 0
+    for token in candidate:
+        if counts.get(token, 0):
+            counts[token] -= 1
+            unigram_overlap += 1
+    return (f_score(unigram_overlap, len(candidate), len(reference)),
+            f_score(lcs_length(candidate, reference), len(candidate), len(reference)))
+
+# Word error rate of a hypothesis against a reference transcript
+def wer(hypothesis, reference):
+    hypothesis, reference = hypothesis.lower().split(), reference.lower().split()
+    row = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(hypothesis, 1):
+            current = row[j]
+            row[j] = min(row[j] + 1, row[j - 1] + 1, previous + (word != other))
+            previous = current
+    return row[-1] / max(len(reference), 1)
+
+# Read the optional reference next to a fixture (<name>.ref for articles, <name>.txt for audio)
+def read_reference(path, extension):
+    reference_path = os.path.splitext(path)[0] + extension
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path, 'r', encoding='utf-8') as file:
+        return file.read().strip()
+
+def compare_summarizers(article_dir, backends):
+    import news_fetch
+
+    paths = sorted(glob.glob(os.path.join(article_dir, '*.txt')))
+    articles = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            articles.append(file.read())
+    if not articles:
+        return
+
+    outputs = {}
+    for backend in backends:
+        summarizer = news_fetch.build_summarizer(backend)
+        summarizer(articles[0], max_length=150, min_length=50, do_sample=False, truncation=True)  # warm-up
+        start = time.perf_counter()
+        outputs[backend] = [summarizer(article, max_length=150, min_length=50, do_sample=False, truncation=True)[0]['summary_text']
+                            for article in articles]
+        latency = (time.perf_counter() - start) / len(articles)
+
+        # Fixtures without a reference summary are scored against the fp32 output
+        scores = []
+        for path, summary, baseline in zip(paths, outputs[backend], outputs.get('fp32', outputs[backend])):
+            reference = read_reference(path, '.ref') or baseline
+            scores.append(rouge(summary, reference))
+        rouge_1, rouge_l = np.mean(scores, axis=0)
+        print(f"summarizer {backend:5s}  {1000 * latency:8.0f} ms/article  ROUGE-1 {rouge_1:.3f}  ROUGE-L {rouge_l:.3f}")
+
+def compare_asr(audio_dir, backends):
+    from asr_engine import Wav2Vec2Engine, load_audio
+
+    paths = sorted(glob.glob(os.path.join(audio_dir, '*.wav')))
+    waveforms = [load_audio(path) for path in paths]
+    if not waveforms:
+        return
+    audio_seconds = sum(len(waveform) for waveform in waveforms) / 16000
+
+    outputs = {}
+    for backend in backends:
+        engine = Wav2Vec2Engine(backend=backend).load()
+        engine.transcribe(waveforms[0])  # warm-up
+        start = time.perf_counter()
+        outputs[backend] = [engine.transcribe(waveform) for waveform in waveforms]
+        elapsed = time.perf_counter() - start
+
+        # Fixtures without a reference transcript are scored against the fp32 output
+        errors = []
+        for path, transcription, baseline in zip(paths, outputs[backend], outputs.get('fp32', outputs[backend])):
+            errors.append(wer(transcription, read_reference(path, '.txt') or baseline))
+        print(f"asr        {backend:5s}  {1000 * elapsed / len(waveforms):8.0f} ms/clip  "
+              f"real-time factor {elapsed / audio_seconds:.3f}  WER {np.mean(errors):.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare accuracy and speed of the fp32, int8 and ONNX inference backends")
+    parser.add_argument('--articles', help="directory of article .txt fixtures, with optional <name>.ref reference summaries")
+    parser.add_argument('--audio', help="directory of .wav fixtures, with optional <name>.txt reference transcripts")
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    args = parser.parse_args()
+
+    # fp32 runs first so it can serve as the reference where fixtures have none
+    backends = sorted(set(args.backends.split(',')), key=BACKENDS.index)
+    if args.articles:
+        compare_summarizers(args.articles, backends)
+    if args.audio:
+        compare_asr(args.audio, backends)
+
+if __name__ == "__main__":
+    main()
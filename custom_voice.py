@@ -1,34 +1,55 @@
-import torchaudio
-from transformers import Wav2Vec2ForCTC, Wav2Vec2Tokenizer
+from asr_engine import Wav2Vec2Engine, load_audio
+import argparse
 import os
-import torch
 
-# Load pre-trained Wav2Vec 2.0 model and tokenizer
-tokenizer = Wav2Vec2Tokenizer.from_pretrained("facebook/wav2vec2-base-960h")
-model = Wav2Vec2ForCTC.from_pretrained("facebook/wav2vec2-base-960h")
+# Wav2Vec 2.0 engine; the model is loaded on the first transcription
+engine = Wav2Vec2Engine()
 
 def transcribe_audio(audio_path):
-    waveform, sample_rate = torchaudio.load(audio_path)
-    if sample_rate != 16000:
-        transform = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=16000)
-        waveform = transform(waveform)
-    input_values = tokenizer(waveform.squeeze().numpy(), return_tensors="pt").input_values
-    logits = model(input_values).logits
-    predicted_ids = torch.argmax(logits, dim=-1)
-    transcription = tokenizer.decode(predicted_ids[0])
-    return transcription.lower()
+    return engine.transcribe_file(audio_path)
+
+# WAV files of a directory, loaded and resampled by the data loader workers (a map-style
+# dataset: DataLoader only needs __len__ and __getitem__, so torch is not imported here)
+class AudioDirectory:
+    def __init__(self, audio_dir):
+        self.file_names = sorted(file_name for file_name in os.listdir(audio_dir) if file_name.endswith(".wav"))
+        self.audio_dir = audio_dir
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __getitem__(self, index):
+        file_name = self.file_names[index]
+        return file_name, load_audio(os.path.join(self.audio_dir, file_name))
 
 # Transcribe all audio files in a directory
-audio_dir = r"C:\Users\Ayush\Desktop\KUL\Thesis\dataset_for_mfa\rapper_songs\rapper1"
-transcriptions = {}
-for file_name in os.listdir(audio_dir):
-    if file_name.endswith(".wav"):
-        file_path = os.path.join(audio_dir, file_name)
-        transcription = transcribe_audio(file_path)
-        transcriptions[file_name] = transcription
-        print(f"Transcribed {file_name}: {transcription}")
-
-# Save transcriptions to a file
-with open("transcriptions.txt", "w") as f:
-    for file_name, transcription in transcriptions.items():
-        f.write(f"{file_name}|{transcription}\n")
+def transcribe_directory(audio_dir, batch_size=8, num_workers=2):
+    from torch.utils.data import DataLoader
+
+    loader = DataLoader(AudioDirectory(audio_dir), batch_size=batch_size, num_workers=num_workers, collate_fn=list)
+    transcriptions = {}
+    for batch in loader:
+        file_names = [file_name for file_name, _ in batch]
+        for file_name, transcription in zip(file_names, engine.transcribe_batch([waveform for _, waveform in batch])):
+            transcriptions[file_name] = transcription
+            print(f"Transcribed {file_name}: {transcription}")
+    return transcriptions
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe all WAV files in a directory with Wav2Vec 2.0")
+    parser.add_argument('audio_dir')
+    parser.add_argument('--output', default="transcriptions.txt")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    engine.batch_size = args.batch_size
+    transcriptions = transcribe_directory(args.audio_dir, args.batch_size, args.workers)
+
+    # Save transcriptions to a file
+    with open(args.output, "w") as f:
+        for file_name, transcription in transcriptions.items():
+            f.write(f"{file_name}|{transcription}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import pandas as pd
+import numpy as np
+import logging
+import json
+import os
+import price_pred
+
+logger = logging.getLogger(__name__)
+
+# Fast forecasting tier: cheap baseline models fitted on the closes of all companies at once,
+# as one (days x companies) array. Each model is scored on the same 10-day holdout that
+# forecast_company uses, the best one forecasts the next business day, and only the
+# companies where even the best one is not accurate enough go on to AutoARIMA.
+FAST_MODELS = ('naive', 'drift', 'ewma', 'ar')
+FAST_LOOKBACK_DAYS = int(os.getenv('FAST_LOOKBACK_DAYS', 500))
+FAST_HOLDOUT_DAYS = 10
+# Companies whose best fast model has a higher holdout MAPE, or a higher one than their last
+# AutoARIMA search, are escalated to AutoARIMA
+FAST_TIER_MAX_MAPE = float(os.getenv('FAST_TIER_MAX_MAPE', price_pred.MAX_WARM_START_MAPE))
+EWMA_ALPHA = float(os.getenv('EWMA_ALPHA', 0.3))
+AR_ORDER = int(os.getenv('AR_ORDER', 5))
+AR_RIDGE = 1e-6
+# Columns per batched solve, bounding the size of the lagged design array
+AR_BLOCK_COLUMNS = 512
+
+# Closing prices of many companies aligned on business days, limited to the last `lookback`
+# days. Companies with a shorter history have leading NaNs; stale ones are carried forward.
+def load_close_matrix(companies, lookback=FAST_LOOKBACK_DAYS):
+    closes = {}
+    for company in companies:
+        try:
+            closes[company] = price_pred.load_close_series(company)
+        except Exception as e:
+            logger.error(f"Could not load the history of {company}: {e}")
+            print(f"Could not load the history of {company}: {e}")
+    if not closes:
+        return pd.DataFrame()
+    matrix = pd.DataFrame(closes).asfreq('B').ffill()
+    return matrix.iloc[-lookback:]
+
+# Index of the first non-NaN row of every column
+def _first_valid(y):
+    return np.argmax(~np.isnan(y), axis=0)
+
+# Last value repeated over the horizon
+def naive(y, horizon):
+    return np.repeat(y[-1:], horizon, axis=0)
+
+# Straight line through the first and last observation of each column
+def drift(y, horizon):
+    first = _first_valid(y)
+    columns = np.arange(y.shape[1])
+    slope = (y[-1] - y[first, columns]) / np.maximum(len(y) - 1 - first, 1)
+    return y[-1] + np.arange(1, horizon + 1)[:, None] * slope
+
+# Exponentially weighted level, repeated over the horizon
+def ewma(y, horizon, alpha=EWMA_ALPHA):
+    level = pd.DataFrame(y).ewm(alpha=alpha, adjust=False, ignore_na=True).mean().to_numpy()[-1]
+    return np.repeat(level[None, :], horizon, axis=0)
+
+# AR(p) with intercept on the log returns of each column, fitted in closed form: the normal
+# equations of all columns are solved as one batch, rows with missing lags getting zero weight
+def ar(y, horizon, order=AR_ORDER):
+    if y.shape[1] > AR_BLOCK_COLUMNS:
+        return np.concatenate([ar(y[:, i:i + AR_BLOCK_COLUMNS], horizon, order) for i in range(0, y.shape[1], AR_BLOCK_COLUMNS)], axis=1)
+    returns = np.diff(np.log(y), axis=0)
+    lags = np.lib.stride_tricks.sliding_window_view(returns, order + 1, axis=0)  # (rows, columns, order + 1)
+    targets = lags[:, :, -1]
+    design = np.concatenate([np.ones(targets.shape + (1,)), lags[:, :, -2::-1]], axis=2)  # intercept, r[t-1], ..., r[t-p]
+    weights = ~(np.isnan(targets) | np.isnan(design).any(axis=2))
+    design = np.where(weights[:, :, None], design, 0.0)
+    targets = np.where(weights, targets, 0.0)
+
+    gram = np.einsum('tnk,tnl->nkl', design, design) + AR_RIDGE * np.eye(order + 1)
+    moments = np.einsum('tnk,tn->nk', design, targets)
+    coefficients = np.linalg.solve(gram, moments[:, :, None])[:, :, 0]  # (columns, order + 1)
+
+    recent = np.nan_to_num(returns[-order:][::-1].T)  # (columns, order), most recent first
+    log_price = np.log(y[-1])
+    forecasts = np.empty((horizon, y.shape[1]))
+    for step in range(horizon):
+        next_return = coefficients[:, 0] + np.einsum('nk,nk->n', coefficients[:, 1:], recent)
+        log_price = log_price + next_return
+        forecasts[step] = np.exp(log_price)
+        recent = np.concatenate([next_return[:, None], recent[:, :-1]], axis=1)
+    return forecasts
+
+FORECASTERS = {'naive': naive, 'drift': drift, 'ewma': ewma, 'ar': ar}
+
+# Forecasts of every model for the next `horizon` rows: {model: (horizon x columns)}
+def forecast_matrix(y, horizon, models=FAST_MODELS):
+    return {model: FORECASTERS[model](y, horizon) for model in models}
+
+# Holdout MAPE of every model for every column: {model: (columns,)}
+def holdout_mape(y, holdout=FAST_HOLDOUT_DAYS, models=FAST_MODELS):
+    y_train, y_test = y[:-holdout], y[-holdout:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {model: np.nanmean(np.abs(forecast - y_test) / np.abs(y_test), axis=0)
+                for model, forecast in forecast_matrix(y_train, holdout, models).items()}
+
+# Holdout MAPE of the last AutoARIMA order search of a company, if there was one
+def arima_mape(company):
+    meta_path = os.path.join(price_pred.prices_folder, f"{company}_model.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r') as file:
+            return json.load(file)['mape']
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Run the fast tier over many companies and save the next-day forecast of those it is good
+# enough for, in the same <Company>_forecast.csv format as forecast_company.
+# Returns ({company: (model, mape)} for the saved forecasts, [companies to escalate to AutoARIMA]).
+def run_fast_tier(companies, max_mape=FAST_TIER_MAX_MAPE, models=FAST_MODELS):
+    matrix = load_close_matrix(companies)
+    escalate = [company for company in companies if company not in matrix.columns]
+    if len(matrix) <= FAST_HOLDOUT_DAYS + AR_ORDER + 1:
+        return {}, list(companies)
+
+    y = matrix.to_numpy()
+    scores = holdout_mape(y, models=models)
+    stacked = np.nan_to_num(np.stack([scores[model] for model in models]), nan=np.inf)
+    best = np.argmin(stacked, axis=0)
+    forecasts = forecast_matrix(y, 1, models)
+    forecast_date = matrix.index[-1] + pd.offsets.BDay(1)
+
+    saved = {}
+    for column, company in enumerate(matrix.columns):
+        model, mape = models[best[column]], stacked[best[column], column]
+        previous = arima_mape(company)
+        if not np.isfinite(mape) or mape > max_mape or (previous is not None and previous < mape):
+            escalate.append(company)
+            continue
+        y_pred = pd.Series([forecasts[model][0, column]], index=pd.DatetimeIndex([forecast_date]), name='Close')
+        y_pred.to_csv(os.path.join(price_pred.prices_folder, f"{company}_forecast.csv"), header=True)
+        saved[company] = (model, float(mape))
+    logger.info(f"Fast tier forecast {len(saved)} companies, escalating {len(escalate)} to AutoARIMA")
+    print(f"Fast tier forecast {len(saved)} companies, escalating {len(escalate)} to AutoARIMA")
+    return saved, escalate
@@ -0,0 +1,308 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import multiprocessing
+import argparse
+import logging
+import json
+import time
+import os
+import price_pred
+import fast_forecast
+import instrumentation
+from watchlist import load_watchlist, WATCHLIST_PATH
+
+logger = logging.getLogger(__name__)
+
+# Forecasting runs in two stages: the missing bars are fetched in batches on a thread pool
+# (network bound) and appended to the history store, then each company's model is fitted on a
+# process pool (CPU bound). A company is handed to the fitting pool as soon as its batch has
+# been stored, results are reported as they finish, and progress is checkpointed so that an
+# interrupted run resumes where it stopped on the same day.
+FORECAST_WORKERS = int(os.getenv('FORECAST_WORKERS', os.cpu_count() or 1))
+FETCH_WORKERS = int(os.getenv('FORECAST_FETCH_WORKERS', 4))
+FETCH_BATCH_SIZE = int(os.getenv('FORECAST_FETCH_BATCH_SIZE', 100))
+# Seconds one company's fit may take, and how often a failed or timed-out fit is retried
+FORECAST_TIMEOUT = float(os.getenv('FORECAST_TIMEOUT', 600))
+FORECAST_RETRIES = int(os.getenv('FORECAST_RETRIES', 1))
+# BLAS / OpenMP threads per fitting process; one each keeps the workers from oversubscribing the cores
+BLAS_THREADS = int(os.getenv('FORECAST_BLAS_THREADS', 1))
+CHECKPOINT_PATH = os.path.join(price_pred.prices_folder, 'forecast_checkpoint.json')
+CHECKPOINT_INTERVAL = 5.0
+# With FAST_TIER=1 the vectorized baselines forecast every company first and AutoARIMA is
+# fitted only for the companies they are not accurate enough for
+FAST_TIER = os.getenv('FAST_TIER', '1') == '1'
+
+BLAS_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Limit the BLAS / OpenMP thread pools of a fitting process. The environment variables cover
+# libraries loaded after this point (spawned workers); threadpoolctl resizes the ones already loaded.
+def limit_blas_threads(blas_threads):
+    for name in BLAS_ENV_VARS:
+        os.environ[name] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    except ImportError:
+        pass
+
+# Per-company progress of today's run:
+# {company: {'status': 'fetched' | 'fetch_failed' | 'escalated' | 'done' | 'failed', 'attempts', 'error'}},
+# where 'escalated' companies were left to AutoARIMA by the fast tier
+class Checkpoint:
+    def __init__(self, path=CHECKPOINT_PATH, fresh=False):
+        self.path = path
+        self.date = datetime.now().strftime("%Y-%m-%d")
+        self.companies = {}
+        self._saved_at = 0.0
+        if not fresh and os.path.exists(path):
+            try:
+                with open(path, 'r') as file:
+                    state = json.load(file)
+                # Progress of an earlier day is stale; those companies need new bars anyway
+                if state.get('date') == self.date:
+                    self.companies = state.get('companies', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable checkpoint {path}: {e}")
+
+    def status(self, company):
+        return self.companies.get(company, {}).get('status')
+
+    def attempts(self, company):
+        return self.companies.get(company, {}).get('attempts', 0)
+
+    def mark(self, company, status, error=None, attempts=None):
+        entry = self.companies.setdefault(company, {'attempts': 0})
+        entry['status'] = status
+        entry['error'] = error
+        if attempts is not None:
+            entry['attempts'] = attempts
+        if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    # Write the checkpoint atomically
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({'date': self.date, 'companies': self.companies}, file)
+        os.replace(temp_path, self.path)
+        self._saved_at = time.monotonic()
+
+# Fetch and store the missing bars of a group of companies ({company: symbol}) with one batched
+# request, falling back to one request per symbol if it fails. Returns {company: stored}.
+def fetch_group(companies):
+    batch = price_pred.fetch_batch(companies)
+    stored = {}
+    for company, symbol in companies.items():
+        try:
+            new_data = batch.get(symbol) if batch is not None else None
+            stored[company] = price_pred.update_history(company, symbol, new_data)
+        except Exception as e:
+            logger.error(f"Could not store the history of {company}: {e}")
+            print(f"Could not store the history of {company}: {e}")
+            stored[company] = False
+    return stored
+
+# Process pool whose workers can be replaced when a fit hangs; a running task cannot be
+# cancelled, so its worker processes are terminated instead
+class FitPool:
+    def __init__(self, workers, blas_threads):
+        self.workers = workers
+        self.blas_threads = blas_threads
+        self.executor = None
+        self.start()
+
+    # Workers are spawned rather than forked, also on Linux: they start on the first submit(),
+    # while the download threads are running, and a forked child could inherit a lock one of
+    # them holds (such as the metrics registry's) and hang until its fit times out
+    def start(self):
+        # Spawned workers read the limits from the environment before importing NumPy
+        for name in BLAS_ENV_VARS:
+            os.environ.setdefault(name, str(self.blas_threads))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=limit_blas_threads, initargs=(self.blas_threads,))
+
+    def submit(self, company):
+        return self.executor.submit(price_pred.forecast_company, company)
+
+    def restart(self):
+        processes = list((getattr(self.executor, '_processes', None) or {}).values())
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        self.start()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+# Bring the history and forecast of every company in the watchlist up to date. Yields
+# (company, status, detail) as each company finishes, where status is 'done' (detail: the
+# holdout errors, or the fast model and its MAPE), 'failed' (detail: the error) or 'skipped'.
+def run_forecasts(company_symbols, workers=FORECAST_WORKERS, fetch_workers=FETCH_WORKERS, batch_size=FETCH_BATCH_SIZE,
+                  timeout=FORECAST_TIMEOUT, retries=FORECAST_RETRIES, blas_threads=BLAS_THREADS, fresh=False, fast_tier=FAST_TIER):
+    checkpoint = Checkpoint(fresh=fresh)
+    to_fetch, to_fit, stored = {}, [], []
+    for company, symbol in company_symbols.items():
+        status = checkpoint.status(company)
+        if status == 'done':
+            yield company, 'skipped', 'finished earlier today'
+        elif status == 'fetched':
+            # Stored by an interrupted run before the fast tier ran
+            stored.append(company)
+        elif status in ('escalated', 'failed') and checkpoint.attempts(company) <= retries:
+            # Escalated to AutoARIMA by an interrupted run, or failed before the retries ran out
+            to_fit.append(company)
+        elif status in (None, 'fetch_failed') and price_pred.needs_update(company):
+            to_fetch[company] = symbol
+        else:
+            yield company, 'skipped', 'failed earlier today' if status == 'failed' else 'up to date'
+    logger.info(f"Fetching {len(to_fetch)} companies, forecasting {len(to_fetch) + len(stored) + len(to_fit)}")
+
+    items = list(to_fetch.items())
+    groups = [dict(items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+    fetches = ThreadPoolExecutor(max_workers=max(1, fetch_workers))
+    fits = FitPool(max(1, workers), blas_threads)
+    fetch_futures = {fetches.submit(fetch_group, group): group for group in groups}
+    # Running fits: future -> (company, attempt, started). At most one fit per worker is
+    # submitted, so a fit's submission time is also its start time.
+    fit_futures = {}
+
+    # Forecast freshly stored companies with the fast tier and queue the rest for AutoARIMA
+    def triage(companies):
+        if not fast_tier or not companies:
+            to_fit.extend(companies)
+            return []
+        try:
+            with instrumentation.span('fit', model='fast_tier'):
+                saved, escalate = fast_forecast.run_fast_tier(companies)
+        except Exception as e:
+            logger.error(f"Fast tier failed, fitting {len(companies)} companies with AutoARIMA: {e}")
+            saved, escalate = {}, companies
+        to_fit.extend(escalate)
+        for company in escalate:
+            checkpoint.mark(company, 'escalated')
+        for company in saved:
+            checkpoint.mark(company, 'done')
+        return [(company, 'done', {'model': model, 'mape': mape}) for company, (model, mape) in saved.items()]
+
+    # Queue a failed fit for another attempt, or return its final result once the retries ran out
+    def fit_failed(company, attempt, error):
+        checkpoint.mark(company, 'failed', error, attempt)
+        if attempt <= retries:
+            to_fit.append(company)
+            return None
+        return company, 'failed', error
+
+    # A worker process died (killed for memory, crashed in native code), which breaks the whole
+    # pool. Any of the running fits may have caused it, so each is charged an attempt; the pool
+    # is restarted and the queued companies go on as usual.
+    def pool_broken(error):
+        logger.error(f"A fitting process died, restarting the pool: {error}")
+        results = []
+        for future in list(fit_futures):
+            company, attempt, _ = fit_futures.pop(future)
+            result = fit_failed(company, attempt, f"worker process died: {error}")
+            if result is not None:
+                results.append(result)
+        fits.restart()
+        return results
+
+    try:
+        yield from triage(stored)
+        while fetch_futures or fit_futures or to_fit:
+            while to_fit and len(fit_futures) < fits.workers:
+                company = to_fit.pop(0)
+                attempt = checkpoint.attempts(company) + 1
+                try:
+                    fit_futures[fits.submit(company)] = (company, attempt, time.monotonic())
+                except BrokenProcessPool as e:
+                    to_fit.insert(0, company)
+                    yield from pool_broken(e)
+
+            if fit_futures:
+                next_deadline = min(started for _, _, started in fit_futures.values()) + timeout
+                wait_time = max(0.0, next_deadline - time.monotonic())
+            else:
+                wait_time = None
+            done, _ = wait(list(fetch_futures) + list(fit_futures), timeout=wait_time, return_when=FIRST_COMPLETED)
+
+            broken = None
+            for future in done:
+                if future in fetch_futures:
+                    group = fetch_futures.pop(future)
+                    try:
+                        fetched = future.result()
+                    except Exception as e:
+                        fetched = {company: False for company in group}
+                        logger.error(f"Fetching {len(group)} companies failed: {e}")
+                    for company, ok in fetched.items():
+                        if ok:
+                            checkpoint.mark(company, 'fetched')
+                        else:
+                            checkpoint.mark(company, 'fetch_failed', 'fetch failed')
+                            yield company, 'failed', 'fetch failed'
+                    yield from triage([company for company, ok in fetched.items() if ok])
+                    continue
+
+                company, attempt, started = fit_futures.pop(future)
+                instrumentation.observe('fit_wall_seconds', time.monotonic() - started, model='autoarima')
+                try:
+                    errors = future.result()
+                    checkpoint.mark(company, 'done', attempts=attempt)
+                    yield company, 'done', errors
+                except BrokenProcessPool as e:
+                    broken = e
+                    result = fit_failed(company, attempt, f"worker process died: {e}")
+                    if result is not None:
+                        yield result
+                except Exception as e:
+                    result = fit_failed(company, attempt, str(e))
+                    if result is not None:
+                        yield result
+            if broken is not None:
+                yield from pool_broken(broken)
+
+            # Fits past their deadline are abandoned together with their workers; the other
+            # running fits are resubmitted on the new workers without using up a retry
+            now = time.monotonic()
+            expired = [future for future, (_, _, started) in fit_futures.items() if now - started >= timeout]
+            if expired:
+                for future in list(fit_futures):
+                    company, attempt, _ = fit_futures.pop(future)
+                    if future in expired:
+                        logger.error(f"Fitting {company} timed out after {timeout:.0f}s (attempt {attempt})")
+                        result = fit_failed(company, attempt, f"timed out after {timeout:.0f}s")
+                        if result is not None:
+                            yield result
+                    else:
+                        to_fit.insert(0, company)
+                fits.restart()
+    finally:
+        checkpoint.save()
+        fetches.shutdown(wait=True, cancel_futures=True)
+        fits.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the history and forecast of every company in the watchlist")
+    parser.add_argument('--watchlist', default=WATCHLIST_PATH, help="CSV file with company and symbol columns")
+    parser.add_argument('--workers', type=int, default=FORECAST_WORKERS, help="fitting processes")
+    parser.add_argument('--fetch-workers', type=int, default=FETCH_WORKERS, help="download threads")
+    parser.add_argument('--timeout', type=float, default=FORECAST_TIMEOUT, help="seconds allowed per fit")
+    parser.add_argument('--retries', type=int, default=FORECAST_RETRIES)
+    parser.add_argument('--fresh', action='store_true', help="ignore the checkpoint of an interrupted run")
+    parser.add_argument('--no-fast-tier', dest='fast_tier', action='store_false', default=FAST_TIER,
+                        help="fit AutoARIMA for every company")
+    args = parser.parse_args()
+
+    company_symbols = load_watchlist(args.watchlist)
+    counts = {'done': 0, 'failed': 0, 'skipped': 0}
+    for company, status, detail in run_forecasts(company_symbols, workers=args.workers, fetch_workers=args.fetch_workers,
+                                                 timeout=args.timeout, retries=args.retries, fresh=args.fresh,
+                                                 fast_tier=args.fast_tier):
+        counts[status] += 1
+        print(f"[{sum(counts.values())}/{len(company_symbols)}] {company}: {status} {detail}")
+    print(f"Finished: {counts['done']} forecast, {counts['failed']} failed, {counts['skipped']} skipped")
+    price_pred.publish_snapshot()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import os
+import instrumentation
+
+# Ensure the prices folder exists
+prices_folder = 'prices'
+os.makedirs(prices_folder, exist_ok=True)
+
+# One fixed-size record per daily bar. The date is stored as days since the epoch
+# so the file can be memory-mapped as a flat array and appended to without rewriting.
+HISTORY_DTYPE = np.dtype([
+    ('date', '<i8'),
+    ('Open', '<f8'),
+    ('High', '<f8'),
+    ('Low', '<f8'),
+    ('Close', '<f8'),
+    ('Volume', '<f8'),
+])
+HISTORY_COLUMNS = [name for name in HISTORY_DTYPE.names if name != 'date']
+
+# Path of the binary history file for a company
+def history_path(company):
+    return os.path.join(prices_folder, f"{company}_history.bin")
+
+# Memory-map the whole history of a company as a structured array (empty if there is none yet)
+def load_records(company):
+    path = history_path(company)
+    if not os.path.exists(path) or os.path.getsize(path) < HISTORY_DTYPE.itemsize:
+        return np.empty(0, dtype=HISTORY_DTYPE)
+    count = os.path.getsize(path) // HISTORY_DTYPE.itemsize
+    return np.memmap(path, dtype=HISTORY_DTYPE, mode='r', shape=(count,))
+
+# Read the whole history of a company as a DataFrame indexed by date
+@instrumentation.timed('file_io', op='history_read')
+def read_history(company):
+    records = load_records(company)
+    index = pd.DatetimeIndex(records['date'].astype('datetime64[D]'), name='Date')
+    return pd.DataFrame({column: np.asarray(records[column]) for column in HISTORY_COLUMNS}, index=index)
+
+# Read only the last stored bar, without touching the rest of the file
+@instrumentation.timed('file_io', op='history_read_last')
+def read_last_row(company):
+    path = history_path(company)
+    if not os.path.exists(path):
+        return None
+    size = os.path.getsize(path)
+    # Ignore a partially written trailing record
+    offset = (size // HISTORY_DTYPE.itemsize - 1) * HISTORY_DTYPE.itemsize
+    if offset < 0:
+        return None
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        record = np.frombuffer(file.read(HISTORY_DTYPE.itemsize), dtype=HISTORY_DTYPE)[0]
+    row = {column: float(record[column]) for column in HISTORY_COLUMNS}
+    row['Date'] = pd.Timestamp(np.datetime64(int(record['date']), 'D'))
+    return row
+
+# Close of the last stored session before a date (today by default), or None. Unlike the last
+# row, this is the correct previous close during the day even if today's bar is already stored.
+@instrumentation.timed('file_io', op='history_read_previous')
+def read_previous_close(company, before=None):
+    records = load_records(company)
+    before = pd.Timestamp(before) if before is not None else pd.Timestamp.now()
+    position = np.searchsorted(records['date'], np.datetime64(before.date(), 'D').astype('<i8'), side='left')
+    if position == 0:
+        return None
+    return float(records['Close'][position - 1])
+
+# Date of the last stored bar, or None if there is no history yet
+def last_date(company):
+    row = read_last_row(company)
+    return row['Date'].date() if row is not None else None
+
+# Append the bars of a downloaded frame that are newer than the last stored date.
+# Returns the number of rows written.
+@instrumentation.timed('file_io', op='history_append')
+def append_history(company, df):
+    if df is None or df.empty:
+        return 0
+    df = df.sort_index()
+    stored_until = last_date(company)
+    if stored_until is not None:
+        df = df[df.index.date > stored_until]
+    df = df.dropna(subset=['Close'])
+    if df.empty:
+        return 0
+
+    records = np.empty(len(df), dtype=HISTORY_DTYPE)
+    records['date'] = df.index.values.astype('datetime64[D]').astype('<i8')
+    for column in HISTORY_COLUMNS:
+        records[column] = df[column].to_numpy(dtype='<f8') if column in df else np.nan
+
+    path = history_path(company)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    with open(path, 'ab') as file:
+        # Drop a partially written trailing record left by an interrupted run
+        if size % HISTORY_DTYPE.itemsize:
+            file.truncate(size - size % HISTORY_DTYPE.itemsize)
+        file.write(records.tobytes())
+    return len(records)
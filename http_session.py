@@ -0,0 +1,15 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP session with a connection pool of `pool_size` connections per host and retries with
+# backoff on connection errors and transient statuses. After the last retry the final response
+# is returned, so callers see the status instead of a retry error.
+def make_session(pool_size, headers=None):
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(headers or {})
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
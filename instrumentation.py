@@ -0,0 +1,209 @@
+import contextlib
+import bisect
+import functools
+import multiprocessing
+import threading
+import cProfile
+import logging
+import atexit
+import pstats
+import json
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+# Timing and metrics shared by the assistant and the batch jobs. Hot paths are wrapped in
+# spans; each span adds its duration to a latency histogram and counts its errors. Metrics are
+# kept in memory and written as a Prometheus text file (metrics/<job>.prom) when the process
+# exits, and periodically by long-running processes. With METRICS_SPAN_LOG=1 every span is also
+# appended to metrics/spans.jsonl, and with PROFILE=1 the main thread runs under cProfile.
+METRICS_FOLDER = os.getenv('METRICS_FOLDER', 'metrics')
+METRICS_SPAN_LOG = os.getenv('METRICS_SPAN_LOG', '0') == '1'
+PROFILE = os.getenv('PROFILE', '0') == '1'
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Name of the running script, used for the metrics and profile files
+JOB = os.path.splitext(os.path.basename(sys.argv[0]))[0] if sys.argv and sys.argv[0] else 'python'
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+class Registry:
+    def __init__(self, span_log=METRICS_SPAN_LOG, folder=METRICS_FOLDER):
+        self.counters = {}
+        self.histograms = {}
+        self.folder = folder
+        self.span_log = span_log
+        self._span_file = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Time a block as <name>_seconds and count failures as <name>_errors_total
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe(f"{name}_seconds", duration, **labels)
+            if error is not None:
+                self.inc(f"{name}_errors_total", **labels)
+            if self.span_log:
+                self._log_span(name, duration, labels, parent, error)
+
+    # Decorator form of span()
+    def timed(self, name, **labels):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _log_span(self, name, duration, labels, parent, error):
+        record = {'ts': time.time(), 'job': JOB, 'pid': os.getpid(), 'thread': threading.current_thread().name,
+                  'span': name, 'parent': parent, 'seconds': duration, 'labels': labels, 'error': error}
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            if self._span_file is None:
+                os.makedirs(self.folder, exist_ok=True)
+                self._span_file = open(os.path.join(self.folder, 'spans.jsonl'), 'a', buffering=1)
+            self._span_file.write(line)
+
+    # Metrics in the Prometheus text exposition format
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in histograms]
+        typed = set()
+        for (name, key), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), counts, total, count, buckets in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    # Write the metrics to metrics/<job>.prom atomically
+    def write_prometheus(self, path=None):
+        path = path or os.path.join(self.folder, f"{JOB}.prom")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def close(self):
+        with self._lock:
+            if self._span_file is not None:
+                self._span_file.close()
+                self._span_file = None
+
+registry = Registry()
+span = registry.span
+timed = registry.timed
+inc = registry.inc
+observe = registry.observe
+
+# Write the metrics every `interval` seconds from a daemon thread, for processes that run until stopped
+def start_exporter(interval=60.0):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.write_prometheus()
+            except OSError as e:
+                logger.error(f"Could not write the metrics: {e}")
+    thread = threading.Thread(target=run, name='metrics-exporter', daemon=True)
+    thread.start()
+    return thread
+
+_profiler = None
+
+# Run the main thread under cProfile until exit (PROFILE=1); the stats go to metrics/<job>.prof
+def start_profiling():
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+def _stop_profiling():
+    if _profiler is None:
+        return
+    _profiler.disable()
+    os.makedirs(METRICS_FOLDER, exist_ok=True)
+    path = os.path.join(METRICS_FOLDER, f"{JOB}.prof")
+    _profiler.dump_stats(path)
+    print(f"Profile saved to {path}. Slowest calls by cumulative time:")
+    pstats.Stats(_profiler).sort_stats('cumulative').print_stats(20)
+
+def _at_exit():
+    _stop_profiling()
+    try:
+        if registry.counters or registry.histograms:
+            registry.write_prometheus()
+    except OSError as e:
+        logger.error(f"Could not write the metrics: {e}")
+    registry.close()
+
+# Only the main process writes metrics/<job>.prom and profiles. Pool workers started with spawn
+# (the default on Windows) import this module too and run atexit handlers on exit, and would
+# overwrite the parent's files with their partial data; their spans reach the span log only.
+if multiprocessing.parent_process() is None:
+    atexit.register(_at_exit)
+    if PROFILE:
+        start_profiling()
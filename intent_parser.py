@@ -0,0 +1,172 @@
+from collections import namedtuple, deque
+import re
+
+# Result of parsing a command: the intent name, the (company, symbol) pairs mentioned in it in
+# order, and for "elaborate" the words after the trigger phrase
+ParsedCommand = namedtuple('ParsedCommand', ['intent', 'entities', 'keyword'])
+
+# Trigger phrases of each intent
+INTENT_PHRASES = {
+    'thanks': ["thank you", "thanks"],
+    'news': ["news", "headlines", "headline"],
+    'elaborate': ["elaborate on", "elaborate", "tell me more about", "more about"],
+    'portfolio': ["portfolio", "my stocks", "my holdings", "holdings"],
+    'price': ["price", "prices", "quote", "quotes", "trading at", "worth", "cost"],
+    'predict': ["predict", "prediction", "predicted", "forecast", "tomorrow"],
+    'range': ["range", "day range", "high and low", "high", "low", "open"],
+    'volume': ["volume", "shares traded", "vwap", "average price"],
+}
+
+# Tickers that are also everyday words (or contraction endings, as in "we're") are only recognized
+# when spelled out letter by letter; single-letter tickers never are, as "don't" leaves a "t"
+COMMON_WORDS = {
+    'a', 'all', 'am', 'an', 'and', 'any', 'are', 'be', 'big', 'can', 'car', 'cat', 'day', 'do', 'for', 'fun',
+    'go', 'good', 'has', 'hi', 'how', 'i', 'if', 'is', 'it', 'key', 'low', 'man', 'me', 'new', 'now', 'of',
+    'on', 'one', 'or', 'out', 'see', 'so', 'the', 'to', 'two', 'up', 'us', 'was', 'way', 'we', 'well', 'you',
+    're', 'll', 've',
+}
+# Only words this long are corrected to a name word within one edit (which may be one letter
+# shorter); shorter ones are too often another real word ("apply" for "apple")
+FUZZY_MIN_LENGTH = 6
+POSSESSIVE = re.compile(r"['\u2019]s\b")
+
+# Lowercase word tokens; possessives are dropped ("apple's" -> "apple") and other apostrophes split words
+def tokenize(text):
+    return re.findall(r"[a-z0-9&]+", POSSESSIVE.sub('', text.lower()))
+
+# Word-level Aho-Corasick automaton: finds every pattern (a sequence of tokens) in a token
+# sequence in one pass, independent of the number of patterns
+class PhraseAutomaton:
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+    def add(self, tokens, payload):
+        state = 0
+        for token in tokens:
+            if token not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][token] = len(self._goto) - 1
+            state = self._goto[state][token]
+        self._output[state].append((len(tokens), payload))
+
+    # Compute the failure links breadth first; must be called after the last add()
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+                queue.append(child)
+        return self
+
+    # Yield (start, end, payload) for every match, end exclusive
+    def find(self, tokens):
+        state = 0
+        for i, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for length, payload in self._output[state]:
+                yield i + 1 - length, i + 1, payload
+
+# All strings obtained by deleting one character, used for edit-distance-1 lookups
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+# True if two words differ by at most one insertion, deletion, substitution or adjacent transposition
+def _within_one_edit(a, b):
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    return any(b[:i] + b[i + 1:] == a for i in range(len(b)))
+
+# Parser compiled from a watchlist ({company: symbol}) and optional aliases ({company: [names]}).
+# Company names, aliases and tickers go into one automaton together with the intent phrases,
+# and misrecognized name words are corrected against a deletion index (edit distance 1), so
+# parsing cost does not grow with the size of the watchlist.
+class IntentParser:
+    def __init__(self, company_symbols, aliases=None):
+        self.company_symbols = dict(company_symbols)
+        self._automaton = PhraseAutomaton()
+        self._vocabulary = set()
+        self._deletion_index = {}
+
+        for intent, phrases in INTENT_PHRASES.items():
+            for phrase in phrases:
+                self._automaton.add(tokenize(phrase), ('intent', intent))
+
+        for company, symbol in self.company_symbols.items():
+            names = [company] + list((aliases or {}).get(company, []))
+            for name in names:
+                tokens = tokenize(name)
+                self._automaton.add(tokens, ('entity', company))
+                self._add_vocabulary(tokens)
+            ticker = symbol.lower()
+            if len(ticker) > 1 and ticker not in COMMON_WORDS:
+                self._automaton.add([ticker], ('entity', company))
+            # Spelled-out ticker, e.g. "a a p l"
+            if len(ticker) > 1 and ticker.isalpha():
+                self._automaton.add(list(ticker), ('entity', company))
+        self._automaton.build()
+
+    def _add_vocabulary(self, tokens):
+        for token in tokens:
+            if len(token) >= FUZZY_MIN_LENGTH - 1 and token not in self._vocabulary:
+                self._vocabulary.add(token)
+                for key in _deletes(token) | {token}:
+                    self._deletion_index.setdefault(key, set()).add(token)
+
+    # Replace a word by the single name word within one edit of it, if there is exactly one
+    def _correct(self, token):
+        if len(token) < FUZZY_MIN_LENGTH or token in self._vocabulary:
+            return token
+        candidates = set()
+        for key in _deletes(token) | {token}:
+            candidates.update(self._deletion_index.get(key, ()))
+        candidates = [candidate for candidate in candidates if _within_one_edit(token, candidate)]
+        return candidates[0] if len(candidates) == 1 else token
+
+    def parse(self, command):
+        tokens = [self._correct(token) for token in tokenize(command)]
+
+        # Keep the longest match at each position, without overlaps
+        matches = sorted(self._automaton.find(tokens), key=lambda match: (match[0], match[0] - match[1]))
+        intents, entities, elaborate_end, position = set(), [], None, 0
+        for start, end, (kind, value) in matches:
+            if start < position:
+                continue
+            position = end
+            if kind == 'intent':
+                intents.add(value)
+                if value == 'elaborate' and elaborate_end is None:
+                    elaborate_end = end
+            elif value not in entities:
+                entities.append(value)
+        entities = [(company, self.company_symbols[company]) for company in entities]
+
+        # Rules, from the most to the least specific
+        if elaborate_end is not None:
+            return ParsedCommand('elaborate', entities, ' '.join(tokens[elaborate_end:]))
+        for intent in ('predict', 'range', 'volume'):
+            if entities and intent in intents:
+                return ParsedCommand(intent, entities, None)
+        if entities and ('price' in intents or not intents & {'news', 'portfolio', 'thanks'}):
+            return ParsedCommand('price', entities, None)
+        for intent in ('portfolio', 'news', 'thanks'):
+            if intent in intents:
+                return ParsedCommand(intent, entities, None)
+        return ParsedCommand('unknown', entities, None)
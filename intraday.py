@@ -0,0 +1,279 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import market_data
+import threading
+import logging
+import csv
+import os
+
+logger = logging.getLogger(__name__)
+
+# Symbols whose last bars fall in the same bucket are fetched in one request
+INTRADAY_BUCKET = pd.Timedelta(minutes=int(os.getenv('INTRADAY_BUCKET_MINUTES', 5)))
+
+# Rolling intraday state per symbol: last price, session open / high / low, volume, VWAP and the
+# previous session's close. The state is updated incrementally from 1-minute bars or single
+# trades, so each poll only has to move the bars since the previous one.
+class SessionState:
+    def __init__(self, symbol, day, previous_close=None):
+        self.symbol = symbol
+        self.day = day
+        self.previous_close = previous_close
+        self.open = None
+        self.high = None
+        self.low = None
+        self.last = None
+        self.volume = 0.0
+        self.turnover = 0.0  # sum of price x volume, for the VWAP
+        self.last_bar_time = None
+        # (volume, turnover) added by the last bar, taken back out if that bar is revised
+        self._last_bar = (0.0, 0.0)
+
+    @property
+    def vwap(self):
+        return self.turnover / self.volume if self.volume else self.last
+
+    def _extend(self, price_open, high, low, close):
+        if self.open is None:
+            self.open = price_open
+        self.high = high if self.high is None else max(self.high, high)
+        self.low = low if self.low is None else min(self.low, low)
+        self.last = close
+
+    # Apply a 1-minute bar. A bar with the same timestamp as the last one replaces it (Yahoo
+    # keeps updating the current minute); older bars are ignored.
+    def apply_bar(self, timestamp, price_open, high, low, close, volume):
+        if self.last_bar_time is not None and timestamp < self.last_bar_time:
+            return False
+        volume = 0.0 if pd.isna(volume) else volume
+        if timestamp == self.last_bar_time:
+            self.volume -= self._last_bar[0]
+            self.turnover -= self._last_bar[1]
+        turnover = volume * (high + low + close) / 3
+        self.volume += volume
+        self.turnover += turnover
+        self._last_bar = (volume, turnover)
+        self.last_bar_time = timestamp
+        self._extend(price_open, high, low, close)
+        return True
+
+    # Apply a single trade from a push feed
+    def apply_trade(self, timestamp, price, size=0.0):
+        size = 0.0 if pd.isna(size) else size
+        self.volume += size
+        self.turnover += price * size
+        self._extend(price, price, price, price)
+
+    def quote(self):
+        return {
+            'price': self.last,
+            'previous_close': self.previous_close,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'vwap': self.vwap,
+            'volume': self.volume,
+            'day': self.day.isoformat(),
+        }
+
+class IntradayAggregator:
+    def __init__(self):
+        self._states = {}
+        self._previous_closes = {}
+        self._lock = threading.Lock()
+
+    # Previous close of a symbol for the session on `day`
+    def set_previous_close(self, symbol, price, day):
+        with self._lock:
+            self._previous_closes[symbol] = (day, price)
+            state = self._states.get(symbol)
+            if state is not None and state.day == day:
+                state.previous_close = price
+
+    # State of the session of `day`. When a new session starts, the last price of the previous
+    # one becomes its previous close unless one was set explicitly.
+    def _session(self, symbol, day):
+        state = self._states.get(symbol)
+        if state is None or state.day < day:
+            previous_day, previous_close = self._previous_closes.get(symbol, (None, None))
+            if previous_day != day:
+                previous_close = state.last if state is not None else None
+            state = self._states[symbol] = SessionState(symbol, day, previous_close)
+        return state if state.day == day else None
+
+    def apply_bar(self, symbol, timestamp, price_open, high, low, close, volume):
+        with self._lock:
+            state = self._session(symbol, timestamp.date())
+            return state is not None and state.apply_bar(timestamp, price_open, high, low, close, volume)
+
+    def apply_trade(self, symbol, timestamp, price, size=0.0):
+        with self._lock:
+            state = self._session(symbol, timestamp.date())
+            if state is not None:
+                state.apply_trade(timestamp, price, size)
+
+    # Apply the rows of a 1-minute bar frame (Open, High, Low, Close, Volume) of one symbol
+    def apply_frame(self, symbol, frame):
+        applied = 0
+        for timestamp, row in frame.dropna(subset=['Close']).iterrows():
+            applied += self.apply_bar(symbol, timestamp, row['Open'], row['High'], row['Low'], row['Close'], row.get('Volume', 0.0))
+        return applied
+
+    def last_bar_time(self, symbol):
+        with self._lock:
+            state = self._states.get(symbol)
+            return state.last_bar_time if state is not None else None
+
+    # Current quote of a symbol, or None before its first price
+    def get(self, symbol):
+        with self._lock:
+            state = self._states.get(symbol)
+            return state.quote() if state is not None and state.last is not None else None
+
+    # Day of the current session of a symbol, or None before its first bar
+    def session_day(self, symbol):
+        with self._lock:
+            state = self._states.get(symbol)
+            return state.day if state is not None else None
+
+    def quotes(self, symbols):
+        quotes = {}
+        for symbol in symbols:
+            quote = self.get(symbol)
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+# Polling adapter backed by Yahoo Finance, usable as a PriceStreamer feed. The first poll
+# downloads the 1-minute bars of the whole session; later polls only request the bars from the
+# last one received onwards. Symbols are requested in groups of similar last bar times, so one
+# symbol that has not traded for a while does not widen the request of the others. The
+# previous close of a session is the last daily close dated before the session's own
+# (exchange) day, so it stays correct once today's bar exists.
+class YahooIntradayFeed:
+    def __init__(self, aggregator=None, bucket=INTRADAY_BUCKET):
+        self.aggregator = aggregator or IntradayAggregator()
+        self.bucket = bucket
+        self._daily_closes = {}
+        self._daily_closes_day = None
+        self._lock = threading.Lock()
+
+    # Daily closes of the last days, downloaded once per day for each symbol
+    def _refresh_daily_closes(self, symbols, today):
+        with self._lock:
+            if self._daily_closes_day != today:
+                self._daily_closes = {}
+                self._daily_closes_day = today
+            missing = [symbol for symbol in symbols if symbol not in self._daily_closes]
+            if not missing:
+                return
+            data = market_data.fetch_histories(missing, start=(today - timedelta(days=10)).strftime("%Y-%m-%d"))
+            frames = market_data.split_by_symbol(data)
+            for symbol in missing:
+                # Symbols without daily data are not requested again until tomorrow
+                frame = frames.get(symbol)
+                self._daily_closes[symbol] = frame['Close'].dropna() if frame is not None else pd.Series(dtype=float)
+
+    def _set_previous_closes(self, symbols):
+        for symbol in symbols:
+            day, closes = self.aggregator.session_day(symbol), self._daily_closes.get(symbol)
+            if day is None or closes is None:
+                continue
+            closes = closes[closes.index.date < day]
+            if not closes.empty:
+                self.aggregator.set_previous_close(symbol, float(closes.iloc[-1]), day)
+
+    # Groups of symbols fetched together, with the time to fetch them from: symbols without
+    # bars yet get the whole session, the others are grouped by the bucket of their last bar
+    def _request_groups(self, symbols):
+        groups = {}
+        for symbol in symbols:
+            last_time = self.aggregator.last_bar_time(symbol)
+            key = None if last_time is None else last_time.floor(self.bucket)
+            groups.setdefault(key, []).append((symbol, last_time))
+        return [([symbol for symbol, _ in members], None if key is None else min(last_time for _, last_time in members))
+                for key, members in groups.items()]
+
+    def poll(self, symbols):
+        symbols = list(symbols)
+        self._refresh_daily_closes(symbols, datetime.now().date())
+        for group, start in self._request_groups(symbols):
+            data = market_data.fetch_intraday_bars(group, start)
+            for symbol, frame in market_data.split_by_symbol(data).items():
+                self.aggregator.apply_frame(symbol, frame)
+        self._set_previous_closes(symbols)
+        return self.aggregator.quotes(symbols)
+
+    # Latest price of each symbol, for the quote cache
+    def prices(self, symbols):
+        return {symbol: quote['price'] for symbol, quote in self.poll(symbols).items()}
+
+# Push adapter: a streaming client (for example a websocket subscription) calls push_trade or
+# push_bar as messages arrive, and the aggregator is updated immediately. poll() only reads the
+# aggregated state, so the feed can also back a PriceStreamer.
+class PushFeed:
+    def __init__(self, aggregator=None):
+        self.aggregator = aggregator or IntradayAggregator()
+        self._listeners = []
+
+    # Register callback(symbol, quote), called after every update
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, symbol):
+        quote = self.aggregator.get(symbol)
+        for callback in self._listeners:
+            try:
+                callback(symbol, quote)
+            except Exception as e:
+                logger.error(f"Intraday listener failed for {symbol}: {e}")
+
+    def push_trade(self, symbol, timestamp, price, size=0.0):
+        self.aggregator.apply_trade(symbol, pd.Timestamp(timestamp), float(price), float(size or 0.0))
+        self._notify(symbol)
+
+    def push_bar(self, symbol, timestamp, price_open, high, low, close, volume=0.0):
+        if self.aggregator.apply_bar(symbol, pd.Timestamp(timestamp), float(price_open), float(high), float(low), float(close), float(volume or 0.0)):
+            self._notify(symbol)
+
+    def set_previous_close(self, symbol, price, day):
+        self.aggregator.set_previous_close(symbol, float(price), day)
+
+    def poll(self, symbols):
+        return self.aggregator.quotes(symbols)
+
+# Replay adapter for tests and offline runs: replays recorded 1-minute bars from a CSV file
+# with symbol, timestamp, open, high, low, close and volume columns. Every poll advances the
+# replay clock by `step` (jumping over gaps without bars) and applies the bars up to it.
+class ReplayFeed:
+    def __init__(self, path, step=timedelta(minutes=1), previous_closes=None):
+        with open(path, 'r', newline='') as file:
+            rows = [(pd.Timestamp(row['timestamp']), row) for row in csv.DictReader(file)]
+        rows.sort(key=lambda item: item[0])
+        self.bars = rows
+        self.step = step
+        self.aggregator = IntradayAggregator()
+        self.clock = rows[0][0] if rows else None
+        self._position = 0
+        for symbol, price in (previous_closes or {}).items():
+            if self.clock is not None:
+                self.aggregator.set_previous_close(symbol, price, self.clock.date())
+
+    @property
+    def finished(self):
+        return self._position >= len(self.bars)
+
+    def poll(self, symbols):
+        symbols = set(symbols)
+        # Skip the time between sessions
+        if not self.finished and self.bars[self._position][0] > self.clock:
+            self.clock = self.bars[self._position][0]
+        while not self.finished and self.bars[self._position][0] <= self.clock:
+            timestamp, row = self.bars[self._position]
+            if row['symbol'] in symbols:
+                self.aggregator.apply_bar(row['symbol'], timestamp, float(row['open']), float(row['high']), float(row['low']),
+                                          float(row['close']), float(row.get('volume') or 0.0))
+            self._position += 1
+        if self.clock is not None:
+            self.clock += self.step
+        return self.aggregator.quotes(symbols)
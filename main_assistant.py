@@ -1,140 +1,182 @@
 import speech_recognition as sr
-import pyttsx3
-import yfinance as yf
-import pandas as pd
 import os
 import random
-import json
+import threading
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import history_store
+from quote_cache import QuoteCache
+from price_stream import PriceStreamer
+from intraday import YahooIntradayFeed
+from speech_pipeline import SpeechWorker, AudioCapture
+from wake_word import WakeWordDetector, load_templates
+from snapshot import SnapshotReader
+from intent_parser import IntentParser
+from watchlist import load_watchlist
+import instrumentation
 
-# Initialize recognizer and text-to-speech engine
+logger = logging.getLogger(__name__)
+
+# Initialize recognizer and text-to-speech worker. The microphone, the offline ASR model and
+# the TTS engine are only opened once main() runs, so importing this module stays cheap.
 recognizer = sr.Recognizer()
-microphone = sr.Microphone()
-engine = pyttsx3.init()
-
-# Set the voice to Voice 1 (Microsoft Zira Desktop - English (United States))
-voices = engine.getProperty('voices')
-engine.setProperty('voice', voices[1].id)
-
-# Dictionary mapping company names to their stock symbols
-company_symbols = {
-    "Google": "GOOGL",
-    "Apple": "AAPL",
-    "Microsoft": "MSFT",
-    "Amazon": "AMZN",
-    "Facebook": "META",
-    "Tesla": "TSLA",
-    "Netflix": "NFLX"
+asr_engine = None
+activated_at = None
+
+# Use Voice 1 (Microsoft Zira Desktop - English (United States))
+speech = SpeechWorker(voice_index=1)
+
+# Commands are handled one at a time off the listening thread, so the next phrase can be
+# captured and recognized while data is fetched and earlier sentences are spoken
+command_executor = ThreadPoolExecutor(max_workers=1)
+shutdown = threading.Event()
+
+# Dictionary mapping company names to their stock symbols, read from the watchlist file
+company_symbols = load_watchlist()
+
+# Other names the companies are asked about by
+company_aliases = {
+    "Google": ["Alphabet"],
+    "Facebook": ["Meta"],
 }
 
+# Commands are matched against the watchlist and the intent phrases in a single pass
+command_parser = IntentParser(company_symbols, company_aliases)
+
 # Ensure the prices and news folders exist
 prices_folder = 'prices'
 news_folder = 'news'
 os.makedirs(prices_folder, exist_ok=True)
 os.makedirs(news_folder, exist_ok=True)
 
+# Background poller keeping the intraday state of the watchlist in memory; each poll only
+# downloads the 1-minute bars since the previous one
+intraday_feed = YahooIntradayFeed()
+price_streamer = PriceStreamer(intraday_feed, company_symbols.values())
+
+# Quotes are cached in-process so repeated questions in a session skip the network round trip.
+# Misses are loaded through the intraday feed, so they also only fetch the bars not seen yet.
+quote_cache = QuoteCache(intraday_feed.prices)
+
+# Forecasts, last closes, headlines and summaries precomputed by the batch jobs
+answers = SnapshotReader()
+
 # List of responses for "thank you"
 thank_you_responses = ["Of course, mister Stark", "No worries, mister Stark", "You're welcome, mister Stark", "My pleasure, mister Stark", "Anytime, mister Stark"]
 
-def listen_for_activation():
-    with microphone as source:
-        recognizer.adjust_for_ambient_noise(source)
-        print("Listening for 'Hey Jarvis' or 'Hair Jarvis' or 'Hairdress'...")
-        audio = recognizer.listen(source)
-
+def recognize_speech(audio):
     try:
-        command = recognizer.recognize_google(audio)
-        print(f"Heard for activation: {command}")
-        # Normalize to lowercase and check for variations
-        accepted_phrases = {"hey jarvis", "hair jarvis", "hairdress"}
-        if any(phrase in command.lower() for phrase in accepted_phrases):
-            return "hey jarvis"
-        else:
-            return ""
+        with instrumentation.span('asr', backend='google' if asr_engine is None else 'wav2vec2'):
+            if asr_engine is not None:
+                return asr_engine.transcribe_audio_data(audio)
+            return recognizer.recognize_google(audio).lower()
     except sr.UnknownValueError:
         return ""
     except sr.RequestError:
         return ""
+    except Exception as e:
+        # The offline model can fail to load (no network for the download, a missing backend)
+        # or to transcribe a phrase; the phrase is dropped and listening goes on
+        logger.error(f"Speech recognition failed: {e}")
+        return ""
 
-def listen_for_command():
-    with microphone as source:
-        recognizer.adjust_for_ambient_noise(source)
-        print("Listening for your command...")
-        audio = recognizer.listen(source)
+def is_activation(command):
+    # Check for variations of the wake phrase
+    accepted_phrases = {"hey jarvis", "hair jarvis", "hairdress"}
+    return any(phrase in command for phrase in accepted_phrases)
 
-    try:
-        command = recognizer.recognize_google(audio)
-        print(f"Heard for command: {command}")
-        return command.lower()
-    except sr.UnknownValueError:
-        return ""
-    except sr.RequestError:
-        return ""
+def activate():
+    global activated_at
+    # Barge-in: the wake phrase interrupts anything still being said
+    speech.interrupt()
+    activated_at = time.monotonic()
+    respond("How can I assist you?")
 
 def respond(text):
-    engine.say(text)
-    engine.runAndWait()
-
-def get_stock_price(symbol, company):
-    stock = yf.Ticker(symbol)
-    todays_data = stock.history(period='1d', interval='1m')
-    
-    if todays_data.empty:
-        raise ValueError(f"No data found for {symbol}")
-
-    print(f"Today's data for {symbol}: {todays_data}")  # Debugging statement
-    latest_price = todays_data['Close'].iloc[-1]
-    print(f"Latest price for {symbol}: {latest_price}")  # Debugging statement
-    
-    # Read the last row from the existing data
-    data_path = os.path.join(prices_folder, f"{company}_data.csv")
-    if os.path.exists(data_path):
-        data_df = pd.read_csv(data_path, index_col=0)
-        previous_close_price = data_df['Close'].iloc[-1]
-        print(f"Previous close price for {company}: {previous_close_price}")  # Debugging statement
-    else:
-        raise ValueError(f"No historical data found for {symbol}")
-    
-    percentage_change = ((latest_price - previous_close_price) / previous_close_price) * 100
-    
-    return latest_price, previous_close_price, percentage_change
+    # Queue the sentence and return immediately; it is spoken by the TTS worker
+    speech.say(text)
+
+@instrumentation.timed('quote_lookup')
+def get_stock_prices(companies):
+    # Use the pre-warmed prices of the background poller where available
+    snapshots = {symbol: price_streamer.get(symbol) for symbol in companies.values()}
+    # Look up the rest in the cache; all misses are fetched in one batched request
+    quotes = quote_cache.get_many([symbol for symbol, snapshot in snapshots.items() if snapshot is None])
+    instrumentation.inc('quotes_total', len(companies) - len(quotes), source='stream')
+    instrumentation.inc('quotes_total', len(quotes), source='cache')
+    logger.debug(f"Latest prices: {quotes}, cache: {quote_cache.stats()}")
+
+    prices = {}
+    for company, symbol in companies.items():
+        snapshot = snapshots[symbol]
+        if snapshot is not None:
+            latest_price = snapshot['price']
+        elif symbol in quotes:
+            latest_price = quotes[symbol]
+        else:
+            raise ValueError(f"No data found for {symbol}")
+
+        if snapshot is not None and snapshot['previous_close'] is not None:
+            previous_close_price = snapshot['previous_close']
+        else:
+            # Read the last close before today from the stored history
+            previous_close_price = history_store.read_previous_close(company)
+            if previous_close_price is None:
+                raise ValueError(f"No historical data found for {symbol}")
+        logger.debug(f"Previous close price for {company}: {previous_close_price}")
+
+        percentage_change = ((latest_price - previous_close_price) / previous_close_price) * 100
+        prices[company] = (latest_price, previous_close_price, percentage_change)
+
+    return prices
+
+# Today's open, high, low, volume and VWAP of each company, from the intraday poller
+def get_intraday_stats(companies):
+    snapshots = {company: price_streamer.get(symbol) for company, symbol in companies.items()}
+    if any(snapshot is None for snapshot in snapshots.values()):
+        price_streamer.refresh()
+        snapshots = {company: price_streamer.get(symbol) for company, symbol in companies.items()}
+    for company, snapshot in snapshots.items():
+        if snapshot is None or snapshot.get('high') is None:
+            raise ValueError(f"No trading data for {company} today yet")
+    return snapshots
 
 def fetch_predicted_price(company):
-    try:
-        forecast_path = os.path.join(prices_folder, f"{company}_forecast.csv")
-        data_path = os.path.join(prices_folder, f"{company}_data.csv")
-        
-        forecast_df = pd.read_csv(forecast_path)
-        data_df = pd.read_csv(data_path)
-        
-        predicted_price = forecast_df.iloc[-1, -1]
-        last_close_price = data_df['Close'].iloc[-1]
-        
-        percentage_change = ((predicted_price - last_close_price) / last_close_price) * 100
-        
-        return predicted_price, percentage_change
-    except Exception as e:
-        raise ValueError(f"Could not fetch the predicted price for {company}: {e}")
+    forecast = answers.prices.get(company)
+    if forecast is None:
+        raise ValueError(f"Could not fetch the predicted price for {company}: no forecast available")
 
-def read_news_from_file(file_path='news/latest_news.json'):
-    try:
-        with open(file_path, 'r') as file:
-            news_data = json.load(file)
-        return news_data
-    except Exception as e:
-        raise ValueError(f"Could not read the news from file: {e}")
+    predicted_price = forecast['predicted_price']
+    last_close_price = forecast['last_close']
+
+    percentage_change = ((predicted_price - last_close_price) / last_close_price) * 100
+
+    return predicted_price, percentage_change
+
+def read_news():
+    news_data = answers.news
+    if not news_data:
+        raise ValueError("Could not read the news: no news available yet")
+    return news_data
 
 def handle_command(command):
-    print(f"Received command: {command}")  # Debugging statement
+    logger.debug(f"Received command: {command}")
+    with instrumentation.span('intent_parse'):
+        parsed = command_parser.parse(command)
+    instrumentation.inc('commands_total', intent=parsed.intent)
 
-    if "thank you" in command:
+    if parsed.intent == 'thanks':
         response = random.choice(thank_you_responses) 
         respond(response)
         print(response)
-        exit()
+        shutdown.set()
+        return
 
-    if "news" in command:
+    if parsed.intent == 'news':
         try:
-            news_data = read_news_from_file()
+            news_data = read_news()
             for idx, news in enumerate(news_data):
                 respond(f"Headline {idx + 1}: {news['title']}")
                 print(f"Headline {idx + 1}: {news['title']}")
@@ -146,15 +188,16 @@ def handle_command(command):
             print(e)
         return
 
-    if "elaborate" in command:
+    if parsed.intent == 'elaborate':
         try:
-            keyword = command.replace("elaborate on", "").strip().lower()
-            news_data = read_news_from_file()
-            for news in news_data:
-                if keyword in news['title'].lower():
-                    respond(news['summary'])
-                    print(news['summary'])
-                    return
+            keyword = parsed.keyword
+            read_news()
+            # Look the keyword up in the inverted index over titles and summaries
+            matches = answers.find_articles(keyword)
+            if matches:
+                respond(matches[0]['summary'])
+                print(matches[0]['summary'])
+                return
             respond(f"Sorry, I couldn't find any article related to {keyword}.")
             print(f"Sorry, I couldn't find any article related to {keyword}.")
         except ValueError as ve:
@@ -165,14 +208,15 @@ def handle_command(command):
             print(e)
         return
 
-    if "portfolio" in command:
-        print("Handling portfolio command")  # Debugging statement
+    if parsed.intent == 'portfolio':
         try:
+            # Start speaking while the prices are fetched
+            respond("Here are the current prices in your portfolio:")
             portfolio_prices = []
+            prices = get_stock_prices(company_symbols)
             for company, symbol in company_symbols.items():
-                latest_price, previous_close_price, percentage_change = get_stock_price(symbol, company)
+                latest_price, previous_close_price, percentage_change = prices[company]
                 portfolio_prices.append(f"The current price of {company} ({symbol}) is ${latest_price:.2f}, which is a change of {percentage_change:.2f}% from the previous close.")
-            respond("Here are the current prices in your portfolio:")
             for price_info in portfolio_prices:
                 respond(price_info)
                 print(price_info)
@@ -181,43 +225,139 @@ def handle_command(command):
             print(f"Error fetching portfolio prices: {e}")
         return
 
-    for company, symbol in company_symbols.items():
-        if company.lower() in command:
-            if "price" in command:
-                try:
-                    latest_price, previous_close_price, percentage_change = get_stock_price(symbol, company)
-                    respond(f"The current price of {company} ({symbol}) is ${latest_price:.2f}, which is a change of {percentage_change:.2f}% from the previous close.")
-                    print(f"The current price of {company} ({symbol}) is ${latest_price:.2f}, which is a change of {percentage_change:.2f}% from the previous close.")
-                except ValueError as ve:
-                    respond(str(ve))
-                    print(ve)
-                except Exception as e:
-                    respond("I could not fetch the stock price. Please try again.")
-                    print(e)
-            elif "predict" in command:
-                try:
-                    predicted_price, percentage_change = fetch_predicted_price(company)
-                    respond(f"The predicted price of {company} ({symbol}) for the next day is ${predicted_price:.2f}, which is a change of {percentage_change:.2f}%")
-                    print(f"The predicted price of {company} ({symbol}) for the next day is ${predicted_price:.2f}, which is a change of {percentage_change:.2f}%")
-                except ValueError as ve:
-                    respond(str(ve))
-                    print(ve)
-                except Exception as e:
-                    respond("I could not fetch the predicted stock price. Please try again.")
-                    print(e)
-            return
+    if parsed.intent == 'price':
+        # All companies named in the command are fetched in one batch
+        try:
+            prices = get_stock_prices(dict(parsed.entities))
+            for company, symbol in parsed.entities:
+                latest_price, previous_close_price, percentage_change = prices[company]
+                respond(f"The current price of {company} ({symbol}) is ${latest_price:.2f}, which is a change of {percentage_change:.2f}% from the previous close.")
+                print(f"The current price of {company} ({symbol}) is ${latest_price:.2f}, which is a change of {percentage_change:.2f}% from the previous close.")
+        except ValueError as ve:
+            respond(str(ve))
+            print(ve)
+        except Exception as e:
+            respond("I could not fetch the stock price. Please try again.")
+            print(e)
+        return
+
+    if parsed.intent == 'predict':
+        for company, symbol in parsed.entities:
+            try:
+                predicted_price, percentage_change = fetch_predicted_price(company)
+                respond(f"The predicted price of {company} ({symbol}) for the next day is ${predicted_price:.2f}, which is a change of {percentage_change:.2f}%")
+                print(f"The predicted price of {company} ({symbol}) for the next day is ${predicted_price:.2f}, which is a change of {percentage_change:.2f}%")
+            except ValueError as ve:
+                respond(str(ve))
+                print(ve)
+            except Exception as e:
+                respond("I could not fetch the predicted stock price. Please try again.")
+                print(e)
+        return
+
+    if parsed.intent in ('range', 'volume'):
+        try:
+            stats = get_intraday_stats(dict(parsed.entities))
+            for company, symbol in parsed.entities:
+                day = stats[company]
+                if parsed.intent == 'range':
+                    answer = f"{company} ({symbol}) opened at ${day['open']:.2f} and has traded between ${day['low']:.2f} and ${day['high']:.2f} today."
+                else:
+                    answer = f"{company} ({symbol}) has traded {day['volume'] / 1e6:.2f} million shares today, at an average price of ${day['vwap']:.2f}."
+                respond(answer)
+                print(answer)
+        except ValueError as ve:
+            respond(str(ve))
+            print(ve)
+        except Exception as e:
+            respond("I could not fetch today's trading data. Please try again.")
+            print(e)
+        return
 
     respond("Sorry, I don't have data for that company.")
     print(f"Command not recognized: {command}")
 
-# Main loop to listen for "Hey Jarvis" and commands
-while True:
-    activation_command = listen_for_activation()
-    if activation_command == "hey jarvis":
-        respond("How can I assist you?")
-        while True:
-            user_command = listen_for_command()
-            if user_command:
-                handle_command(user_command)
-                # Continue listening for commands after handling
-                respond("Listening for your next command...")
+def run_command(command):
+    try:
+        with instrumentation.span('command'):
+            handle_command(command)
+    except Exception as e:
+        print(f"Error handling command '{command}': {e}")
+    if not shutdown.is_set():
+        # Continue listening for commands after handling
+        respond("Listening for your next command...")
+
+# Load the models and fetch the first quotes up front, instead of on the first command
+def prewarm():
+    if asr_engine is not None:
+        try:
+            asr_engine.load()
+        except Exception as e:
+            print(f"Could not load the speech recognition model: {e}")
+    try:
+        price_streamer.refresh()
+    except Exception as e:
+        print(f"Could not pre-warm the watchlist prices: {e}")
+
+def main():
+    global asr_engine
+    parser = argparse.ArgumentParser(description="Voice assistant for your stock portfolio")
+    parser.add_argument('--prewarm', action='store_true', default=os.getenv('PREWARM') == '1',
+                        help="load models and fetch quotes before listening")
+    args = parser.parse_args()
+
+    # Set ASR_BACKEND=wav2vec2 to recognize commands offline instead of with recognize_google
+    if os.getenv('ASR_BACKEND', 'google') == 'wav2vec2':
+        from asr_engine import Wav2Vec2Engine
+        asr_engine = Wav2Vec2Engine()
+    if args.prewarm:
+        prewarm()
+
+    # Load the precomputed answers before the first command
+    answers.get()
+    instrumentation.start_exporter()
+
+    audio_capture = AudioCapture(sr.Microphone())
+
+    # Spot the wake phrase locally when enrolment recordings are available, so that nothing is
+    # sent to the cloud recognizer before activation; otherwise fall back to recognize_google
+    wake_templates = load_templates()
+    if wake_templates:
+        wake_detector = WakeWordDetector(wake_templates, on_detect=activate)
+        audio_capture.add_frame_listener(wake_detector.process)
+    else:
+        wake_detector = None
+        print("No wake-word templates found. Using online recognition for activation.")
+
+    # Start pre-warming the watchlist prices, the TTS worker and the audio capture
+    price_streamer.start()
+    speech.start()
+    audio_capture.start()
+    print("Listening for 'Hey Jarvis' or 'Hair Jarvis' or 'Hairdress'...")
+
+    # Main loop to listen for "Hey Jarvis" and commands
+    while not shutdown.is_set():
+        captured = audio_capture.get(timeout=0.5)
+        if captured is None:
+            continue
+        audio, started_at, ended_at = captured
+        if wake_detector is not None and (activated_at is None or started_at < activated_at):
+            # Only audio after the locally detected wake phrase goes to full recognition
+            continue
+        command = recognize_speech(audio)
+        if not command:
+            continue
+        print(f"Heard: {command}")
+
+        if wake_detector is None and is_activation(command):
+            activate()
+        elif activated_at is not None and not speech.speaking_during(started_at, ended_at):
+            # Phrases overlapping our own speech are ignored, so the assistant does not answer itself
+            command_executor.submit(run_command, command)
+
+    # Let the last answer finish before exiting
+    command_executor.shutdown(wait=True)
+    speech.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import pandas as pd
+import threading
+import logging
+import time
+import os
+import instrumentation
+from http_session import make_session
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of concurrent connections to the data provider, and the minimum
+# gap between two batched requests so that bursts of commands stay under its rate limits
+MAX_CONCURRENCY = int(os.getenv('MARKET_DATA_MAX_CONCURRENCY', 4))
+MIN_REQUEST_INTERVAL = float(os.getenv('MARKET_DATA_MIN_REQUEST_INTERVAL', 0.5))
+
+_session = None
+_session_lock = threading.Lock()
+_throttle_lock = threading.Lock()
+_last_request = 0.0
+
+# Shared HTTP session with a bounded connection pool and retries on transient errors
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session(MAX_CONCURRENCY)
+        return _session
+
+# Wait until at least MIN_REQUEST_INTERVAL has passed since the previous batched request
+def _throttle():
+    global _last_request
+    with _throttle_lock:
+        wait = _last_request + MIN_REQUEST_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+
+# Download bars for many symbols in one request. The result is a single frame aligned on
+# the date index, with (symbol, field) columns.
+def download(symbols, **kwargs):
+    import yfinance as yf
+
+    symbols = list(symbols)
+    _throttle()
+    with instrumentation.span('fetch', source='yahoo'):
+        data = yf.download(symbols, group_by='ticker', threads=MAX_CONCURRENCY, progress=False,
+                           session=get_session(), **kwargs)
+    instrumentation.inc('fetched_symbols_total', len(symbols), source='yahoo')
+    # A single symbol comes back with flat columns
+    if not isinstance(data.columns, pd.MultiIndex):
+        data.columns = pd.MultiIndex.from_product([symbols, data.columns])
+    return data
+
+# Split an aligned (symbol, field) frame into one frame per symbol, dropping rows with no data
+def split_by_symbol(data):
+    frames = {}
+    for symbol in data.columns.get_level_values(0).unique():
+        frames[symbol] = data[symbol].dropna(how='all')
+    return frames
+
+# Fetch the daily bars of many symbols in one request, aligned on date
+def fetch_histories(symbols, start, end=None):
+    return download(symbols, start=start, end=end)
+
+# Fetch the 1-minute bars of many symbols in one request: the whole current session, or
+# only the bars from `start` (a timestamp) onwards
+def fetch_intraday_bars(symbols, start=None):
+    if start is None:
+        return download(symbols, period='1d', interval='1m')
+    return download(symbols, start=start, interval='1m')
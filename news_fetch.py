@@ -1,12 +1,15 @@
 import warnings
 warnings.filterwarnings("ignore", message="floor_divide is deprecated, and will be removed in a future version of pytorch")
 
-import requests
 import json
 import os
-from bs4 import BeautifulSoup
-from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
+import threading
 from dotenv import load_dotenv
+from optimized_models import INFERENCE_BACKEND, optimize_seq2seq_model
+import article_fetch
+from summary_cache import SummaryCache, content_hash
+import snapshot
+import instrumentation
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,6 +18,13 @@ load_dotenv()
 NEWS_API_KEY = os.getenv('NEWS_API_KEY')
 NEWS_API_URL = 'https://newsapi.org/v2/everything'
 NEWS_API_SOURCES = 'forbes,financial-times,the-wall-street-journal,bloomberg,reuters'
+NEWS_PAGE_SIZE = int(os.getenv('NEWS_PAGE_SIZE', 5))
+
+# Summarization limits: articles are cut to MAX_ARTICLE_TOKENS tokens to bound latency, split
+# into chunks that fill the model's input window, and run through the model SUMMARY_BATCH_SIZE
+# chunks at a time
+MAX_ARTICLE_TOKENS = int(os.getenv('MAX_ARTICLE_TOKENS', 4096))
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', 8))
 
 # Ensure the news folder exists
 news_folder = 'news'
@@ -29,19 +39,46 @@ model_name = "sshleifer/distilbart-cnn-12-6"
 model_path = os.path.join(models_folder, model_name.replace('/', '_'))
 
 # Download and save the model if not already present
-if not os.path.exists(model_path):
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model.save_pretrained(model_path)
-    tokenizer.save_pretrained(model_path)
-else:
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-
-# Initialize the summarizer
-summarizer = pipeline("summarization", model=model, tokenizer=tokenizer)
+def load_summarization_model():
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    if not os.path.exists(model_path):
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model.save_pretrained(model_path)
+        tokenizer.save_pretrained(model_path)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+    return model, tokenizer
+
+# Build the summarizer for an inference backend (fp32, int8 or onnx)
+def build_summarizer(backend=INFERENCE_BACKEND):
+    from transformers import pipeline
+
+    model, tokenizer = load_summarization_model()
+    model = optimize_seq2seq_model(model, model_name, backend)
+    return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+# The summarizer is built on first use, so runs that find nothing new never load the model
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+def get_summarizer():
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = build_summarizer()
+        return _summarizer
+
+# Start loading the summarizer in the background, e.g. while the articles are downloaded
+def prewarm():
+    thread = threading.Thread(target=get_summarizer, name="summarizer-prewarm", daemon=True)
+    thread.start()
+    return thread
 
 # Function to fetch the latest financial news with specific keywords from specified sources
+@instrumentation.timed('fetch', source='newsapi')
 def fetch_latest_news():
     try:
         params = {
@@ -49,39 +86,106 @@ def fetch_latest_news():
             'q': 'stock OR financial OR earnings OR investment OR market',
             'language': 'en',
             'sortBy': 'publishedAt',
-            'pageSize': 5,
+            'pageSize': NEWS_PAGE_SIZE,
             'domains': 'forbes.com,ft.com,wsj.com,bloomberg.com,reuters.com'
         }
-        response = requests.get(NEWS_API_URL, params=params)
+        response = article_fetch.get_session().get(NEWS_API_URL, params=params, timeout=article_fetch.REQUEST_TIMEOUT)
 
         news_data = response.json()
         articles = news_data.get('articles', [])
         if not articles:
             raise ValueError("No news articles found.")
         
-        top_articles = articles[:5]
+        top_articles = articles[:NEWS_PAGE_SIZE]
         news_data = [{'title': article['title'], 'url': article['url']} for article in top_articles]
         return news_data
     except Exception as e:
         raise ValueError(f"Could not fetch the latest news: {e}")
 
+# Function to split an article into evenly sized chunks that each fit the model's input window
+def chunk_article(content):
+    summarizer = get_summarizer()
+    tokenizer = summarizer.tokenizer
+    window = min(tokenizer.model_max_length, summarizer.model.config.max_position_embeddings) - tokenizer.num_special_tokens_to_add()
+    token_ids = tokenizer(content, add_special_tokens=False)['input_ids'][:MAX_ARTICLE_TOKENS]
+    if not token_ids:
+        return []
+    chunk_count = -(-len(token_ids) // window)
+    chunk_size = -(-len(token_ids) // chunk_count)
+    return [tokenizer.decode(token_ids[i:i + chunk_size]) for i in range(0, len(token_ids), chunk_size)]
+
+# Function to run the summarizer over many texts in padded batches
+def summarize_batch(texts, max_length, min_length):
+    summarizer = get_summarizer()
+    summaries = []
+    for start in range(0, len(texts), SUMMARY_BATCH_SIZE):
+        with instrumentation.span('inference', model='summarizer'):
+            batch = summarizer(texts[start:start + SUMMARY_BATCH_SIZE], max_length=max_length, min_length=min_length, do_sample=False, truncation=True)
+        summaries.extend(summary['summary_text'] for summary in batch)
+    return summaries
+
+# Function to summarize many article texts. The chunks of all articles are summarized together,
+# then the chunk summaries of each multi-chunk article are summarized again into one summary.
+def summarize_texts(contents):
+    chunks = [chunk_article(content) for content in contents]
+
+    # Map: summarize every chunk of every article
+    chunk_summaries = summarize_batch([chunk for article_chunks in chunks for chunk in article_chunks], max_length=150, min_length=30)
+    summaries, position = [], 0
+    for article_chunks in chunks:
+        summaries.append(chunk_summaries[position:position + len(article_chunks)])
+        position += len(article_chunks)
+
+    # Reduce: combine the chunk summaries of articles that needed more than one chunk
+    to_reduce = [i for i, article_summaries in enumerate(summaries) if len(article_summaries) > 1]
+    reduced = summarize_batch([' '.join(summaries[i]) for i in to_reduce], max_length=150, min_length=50)
+    for i, summary in zip(to_reduce, reduced):
+        summaries[i] = [summary]
+    return [article_summaries[0] if article_summaries else "" for article_summaries in summaries]
+
+# Function to fetch and summarize the content of many articles. Pages are requested
+# conditionally, and only articles that are new or whose text changed reach the model;
+# the other summaries come from the cache.
+def fetch_article_summaries(urls, cache=None):
+    cache = cache if cache is not None else SummaryCache()
+    pages = article_fetch.fetch_articles(urls, [cache.validators(url) for url in urls])
+
+    summaries = [None] * len(urls)
+    to_summarize = []
+    for i, (url, page) in enumerate(zip(urls, pages)):
+        if isinstance(page, Exception):
+            raise ValueError(f"Could not fetch the article: {page}")
+        if page['not_modified'] and cache.summary(url) is not None:
+            summaries[i] = cache.summary(url)
+            continue
+        if page['text'] is None:
+            # Not modified, but no longer cached: fetch it again unconditionally
+            page = article_fetch.fetch_articles([url])[0]
+            if isinstance(page, Exception):
+                raise ValueError(f"Could not fetch the article: {page}")
+        page['hash'] = content_hash(page['text'])
+        summaries[i] = cache.lookup(url, page['hash'])
+        if summaries[i] is None:
+            to_summarize.append(i)
+        else:
+            cache.update_validators(url, page['etag'], page['last_modified'])
+        pages[i] = page
+
+    print(f"Summarizing {len(to_summarize)} of {len(urls)} articles; the rest are cached.")
+    if to_summarize:
+        try:
+            new_summaries = summarize_texts([pages[i]['text'] for i in to_summarize])
+        except Exception as e:
+            raise ValueError(f"Could not summarize the articles: {e}")
+        for i, summary in zip(to_summarize, new_summaries):
+            summaries[i] = summary
+            cache.put(urls[i], pages[i]['hash'], summary, pages[i]['etag'], pages[i]['last_modified'])
+    cache.save()
+    return summaries
+
 # Function to fetch and summarize article content
 def fetch_article_summary(url):
-    try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        paragraphs = soup.find_all('p')
-        content = ' '.join([para.get_text() for para in paragraphs])
-
-        # Truncate or split content if it's too long for the model
-        max_length = 1024
-        if len(content) > max_length:
-            content = content[:max_length]
-
-        summary = summarizer(content, max_length=150, min_length=50, do_sample=False)
-        return summary[0]['summary_text']
-    except Exception as e:
-        raise ValueError(f"Could not fetch or summarize the article: {e}")
+    return fetch_article_summaries([url])[0]
 
 # Function to save news to a file
 def save_news_to_file(news_data, file_path='news/latest_news.json'):
@@ -115,14 +219,20 @@ def main():
         # Check if the fetched news is different from the existing news
         if not is_news_different(fetched_news, existing_news):
             print("News is up to date. Skipping summarization.")
+            snapshot.publish_news(existing_news)
             return
 
-        # Summarize the fetched news
-        for news in fetched_news:
-            news['summary'] = fetch_article_summary(news['url'])
+        # Load the model while the articles are being downloaded
+        prewarm()
+
+        # Download all articles concurrently and summarize them in one batch
+        summaries = fetch_article_summaries([news['url'] for news in fetched_news])
+        for news, summary in zip(fetched_news, summaries):
+            news['summary'] = summary
         
         # Save the summarized news data to a file
         save_news_to_file(fetched_news)
+        snapshot.publish_news(fetched_news)
         print("Latest financial news saved successfully.")
     except ValueError as ve:
         print(ve)
@@ -0,0 +1,90 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Inference backend for the summarizer and ASR models on CPU:
+#   fp32 - the PyTorch models as downloaded
+#   int8 - dynamic int8 quantization of all Linear layers
+#   onnx - ONNX Runtime export (Wav2Vec2 only; the summarizer uses int8 instead, since
+#          beam-search generation needs the PyTorch decoder loop)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'fp32')
+BACKENDS = ('fp32', 'int8', 'onnx')
+
+# Optimized models are cached next to the downloaded ones
+models_folder = 'models'
+os.makedirs(models_folder, exist_ok=True)
+
+def cache_path(model_name, suffix):
+    return os.path.join(models_folder, f"{model_name.replace('/', '_')}_{suffix}")
+
+# Dynamically quantize the Linear layers of a model to int8, reusing a cached copy if there is one
+def quantize(model, model_name):
+    import torch
+
+    path = cache_path(model_name, 'int8.pt')
+    if os.path.exists(path):
+        return torch.load(path)
+    model.eval()
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    torch.save(quantized, path)
+    logger.info(f"Saved int8 model to {path}")
+    return quantized
+
+# Output of OnnxCTCModel, mirroring the .logits attribute of the transformers output
+class CTCOutput:
+    def __init__(self, logits):
+        self.logits = logits
+
+# Wav2Vec2 CTC model running on ONNX Runtime, callable like the PyTorch model
+class OnnxCTCModel:
+    def __init__(self, path, config):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("INFERENCE_BACKEND=onnx requires the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.config = config
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_values, attention_mask=None):
+        import torch
+
+        feed = {'input_values': input_values.numpy()}
+        if attention_mask is not None and 'attention_mask' in {i.name for i in self.session.get_inputs()}:
+            feed['attention_mask'] = attention_mask.numpy()
+        logits, = self.session.run(['logits'], feed)
+        return CTCOutput(torch.from_numpy(logits))
+
+# Export a Wav2Vec2 CTC model to ONNX (once) and load it on ONNX Runtime
+def export_ctc_onnx(model, model_name):
+    import torch
+
+    path = cache_path(model_name, 'ctc.onnx')
+    if not os.path.exists(path):
+        model.eval()
+        dummy = torch.zeros(1, 16000)
+        with torch.no_grad():
+            torch.onnx.export(model, (dummy,), path, input_names=['input_values'], output_names=['logits'],
+                              dynamic_axes={'input_values': {0: 'batch', 1: 'samples'}, 'logits': {0: 'batch', 1: 'frames'}},
+                              opset_version=13)
+        logger.info(f"Exported ONNX model to {path}")
+    return OnnxCTCModel(path, model.config)
+
+# Optimize a Wav2Vec2 CTC model for the selected backend
+def optimize_ctc_model(model, model_name, backend=INFERENCE_BACKEND):
+    if backend == 'int8':
+        return quantize(model, model_name)
+    if backend == 'onnx':
+        return export_ctc_onnx(model, model_name)
+    return model
+
+# Optimize a seq2seq summarization model for the selected backend
+def optimize_seq2seq_model(model, model_name, backend=INFERENCE_BACKEND):
+    if backend in ('int8', 'onnx'):
+        return quantize(model, model_name)
+    return model
@@ -1,35 +1,34 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from sktime.forecasting.arima import AutoARIMA
-from sktime.forecasting.model_selection import temporal_train_test_split
-from sktime.forecasting.base import ForecastingHorizon
-from sktime.performance_metrics.forecasting import mean_absolute_percentage_error, mean_squared_error, mean_absolute_error
 from datetime import datetime, time as dtime, timedelta
 import joblib
-from joblib import Parallel, delayed
 import logging
+import copy
+import json
 import os
+import history_store
+import market_data
+import snapshot
+import instrumentation
+from watchlist import load_watchlist
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# List of company symbols
-company_symbols = {
-    "Google": "GOOGL",
-    "Apple": "AAPL",
-    "Microsoft": "MSFT",
-    "Amazon": "AMZN",
-    "Facebook": "META",
-    "Tesla": "TSLA",
-    "Netflix": "NFLX"
-}
+# Dictionary mapping company names to their stock symbols, read from the watchlist file
+company_symbols = load_watchlist()
 
 # Ensure the prices folder exists
 prices_folder = 'prices'
 os.makedirs(prices_folder, exist_ok=True)
 
+# Warm-start settings: the saved model is updated with only the new observations, and a
+# full AutoARIMA order search runs only on this schedule or when the holdout check fails
+FULL_SEARCH_INTERVAL_DAYS = int(os.getenv('FULL_SEARCH_INTERVAL_DAYS', 30))
+MAX_WARM_START_MAPE = float(os.getenv('MAX_WARM_START_MAPE', 0.05))
+MAX_WARM_START_DRIFT = float(os.getenv('MAX_WARM_START_DRIFT', 2.0))
+
 # Check if today is a business day and within market hours
 def is_market_open():
     now = datetime.now()
@@ -45,107 +44,242 @@ def is_market_open():
         return False
     return True
 
-# Check if the latest date in the data is today's date
-def needs_update(file_path):
-    if not os.path.exists(file_path):
-        logger.info(f"File {file_path} does not exist. Needs update.")
-        print(f"File {file_path} does not exist. Needs update.")
+# Check if the latest date in the stored history is today's date
+def needs_update(company):
+    last_date = history_store.last_date(company)
+    if last_date is None:
+        logger.debug(f"No stored history for {company}. Needs update.")
         return True
-    df = pd.read_csv(file_path, index_col=0, parse_dates=True)
-    last_date = df.index[-1].date()
     today = datetime.now().date()
-    logger.info(f"Last date in {file_path}: {last_date}, Today's date: {today}")
-    print(f"Last date in {file_path}: {last_date}, Today's date: {today}")
-    if last_date < today:
-        logger.info(f"Data in {file_path} is not up to date. Needs update.")
-        print(f"Data in {file_path} is not up to date. Needs update.")
-        return True
-    else:
-        logger.info(f"Data in {file_path} is up to date. No update needed.")
-        print(f"Data in {file_path} is up to date. No update needed.")
-        return False
+    logger.debug(f"Last date stored for {company}: {last_date}, Today's date: {today}")
+    return last_date < today
+
+# Fetch the daily bars from start_date onwards (the full history since 2010 if start_date is None)
+def fetch_data(symbol, start_date=None):
+    import yfinance as yf
 
-# Fetch historical data
-def fetch_data(symbol, start_date="2010-01-01"):
     end_date = datetime.now().strftime("%Y-%m-%d")
     try:
-        stock_data = yf.download(symbol, start=start_date, end=end_date)
-        if stock_data.empty:
-            stock_data = yf.download(symbol)
-        stock_data = stock_data.asfreq('B')  # Set the frequency to business days
-        stock_data = stock_data.interpolate(method='linear')  # Interpolate missing values
-        logger.info(f"Data for {symbol} starts from {stock_data.index[0].date()} and ends at {stock_data.index[-1].date()}")
-        print(f"Data for {symbol} starts from {stock_data.index[0].date()} and ends at {stock_data.index[-1].date()}")
+        if start_date is None:
+            stock_data = yf.download(symbol, start="2010-01-01", end=end_date)
+            if stock_data.empty:
+                stock_data = yf.download(symbol)
+        elif start_date >= end_date:
+            # Nothing newer than the stored history can be complete yet
+            return pd.DataFrame()
+        else:
+            stock_data = yf.download(symbol, start=start_date, end=end_date)
+        if not stock_data.empty:
+            logger.info(f"Fetched {len(stock_data)} rows for {symbol} from {stock_data.index[0].date()} to {stock_data.index[-1].date()}")
+            print(f"Fetched {len(stock_data)} rows for {symbol} from {stock_data.index[0].date()} to {stock_data.index[-1].date()}")
         return stock_data
     except Exception as e:
         logger.error(f"Could not fetch data for {symbol}: {e}")
         print(f"Could not fetch data for {symbol}: {e}")
         return None
 
-# Train and forecast using sktime AutoARIMA
-def train_and_forecast(company, symbol):
+# First date to fetch for a company: the day after its last stored bar, or None for the full history
+def next_start_date(company):
+    last_date = history_store.last_date(company)
+    return (last_date + timedelta(days=1)).strftime("%Y-%m-%d") if last_date else None
+
+# Fetch the missing bars of many companies ({company: symbol}) in one batched request.
+# Returns a dict of symbol to frame, or None if the batched request failed.
+def fetch_batch(companies):
+    start_dates = [next_start_date(company) for company in companies]
+    start_date = "2010-01-01" if None in start_dates else min(start_dates)
+    end_date = datetime.now().strftime("%Y-%m-%d")
+    if start_date >= end_date:
+        return {}
     try:
-        forecast_path = os.path.join(prices_folder, f"{company}_forecast.csv")
-        data_path = os.path.join(prices_folder, f"{company}_data.csv")
-        model_path = os.path.join(prices_folder, f"{company}_model.joblib")
-        
-        # Check if the data is up to date
-        if not needs_update(data_path):
-            logger.info(f"Data for {company} is up to date. Skipping update.")
-            print(f"Data for {company} is up to date. Skipping update.")
-            return
-        
-        df = fetch_data(symbol)
-        if df is None:
-            return
-        
-        df = df[['Close']]
-        df.to_csv(data_path)  # Save the updated data
-        y = df['Close']
-        
-        # Split the data into training and test sets
-        y_train, y_test = temporal_train_test_split(y, test_size=10)
-        
-        # Define the forecasting horizon
-        fh = ForecastingHorizon(y_test.index, is_relative=False)
-        
-        # Initialize and train the AutoARIMA model
-        model = AutoARIMA(sp=1, suppress_warnings=True)
-        model.fit(y_train)
-        
-        # Make predictions
+        data = market_data.fetch_histories(list(companies.values()), start=start_date, end=end_date)
+        logger.info(f"Fetched {len(data)} rows for {len(companies)} symbols starting from {start_date}")
+        print(f"Fetched {len(data)} rows for {len(companies)} symbols starting from {start_date}")
+        return market_data.split_by_symbol(data)
+    except Exception as e:
+        logger.error(f"Batched fetch failed, falling back to one request per symbol: {e}")
+        print(f"Batched fetch failed, falling back to one request per symbol: {e}")
+        return None
+
+# Bring the local history of a company up to date by fetching only the bars after the last stored date.
+# Bars already fetched in a batch can be passed in as new_data.
+def update_history(company, symbol, new_data=None):
+    if new_data is None:
+        new_data = fetch_data(symbol, next_start_date(company))
+    if new_data is None:
+        return False
+    appended = history_store.append_history(company, new_data)
+    logger.info(f"Appended {appended} new rows to the history of {company}")
+    print(f"Appended {appended} new rows to the history of {company}")
+    return True
+
+# Load the stored closing prices as a business-day series
+def load_close_series(company):
+    df = history_store.read_history(company)
+    df = df.asfreq('B')  # Set the frequency to business days
+    df = df.interpolate(method='linear')  # Interpolate missing values
+    return df['Close']
+
+# Load the persisted model and its metadata, if both exist
+def load_model(model_path, meta_path):
+    if not os.path.exists(model_path) or not os.path.exists(meta_path):
+        return None, None
+    try:
+        model = joblib.load(model_path)
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        return model, meta
+    except Exception as e:
+        logger.error(f"Could not load the saved model from {model_path}: {e}")
+        print(f"Could not load the saved model from {model_path}: {e}")
+        return None, None
+
+# Save the model together with the date of its last full order search and its holdout error
+def save_model(model, meta, model_path, meta_path):
+    joblib.dump(model, model_path)
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file)
+
+# Last timestamp the model has been fitted or updated on
+def model_cutoff(model):
+    cutoff = model.cutoff
+    if isinstance(cutoff, pd.Index):
+        cutoff = cutoff[-1]
+    return pd.Timestamp(cutoff)
+
+# Check whether the saved model can be warm-started on the training series
+def can_warm_start(model, meta, y_train):
+    if model is None:
+        return False
+    searched_on = datetime.strptime(meta['searched_on'], "%Y-%m-%d").date()
+    if (datetime.now().date() - searched_on).days >= FULL_SEARCH_INTERVAL_DAYS:
+        logger.info(f"Last full order search was on {searched_on}. Running a new one.")
+        print(f"Last full order search was on {searched_on}. Running a new one.")
+        return False
+    # The stored history must extend the series the model was fitted on
+    cutoff = model_cutoff(model)
+    if cutoff not in y_train.index:
+        logger.info(f"Model cutoff {cutoff.date()} is not in the training data. Running a full order search.")
+        print(f"Model cutoff {cutoff.date()} is not in the training data. Running a full order search.")
+        return False
+    return True
+
+# Update the saved model with the observations after its cutoff, keeping the searched order
+def warm_start(model, y_train):
+    y_new = y_train[y_train.index > model_cutoff(model)]
+    if not y_new.empty:
+        model.update(y_new, update_params=True)
+    logger.info(f"Warm-started the saved model with {len(y_new)} new observations")
+    print(f"Warm-started the saved model with {len(y_new)} new observations")
+    return model
+
+# Run a full AutoARIMA order search on the training series
+def full_search(y_train):
+    from sktime.forecasting.arima import AutoARIMA
+
+    model = AutoARIMA(sp=1, suppress_warnings=True)
+    model.fit(y_train)
+    return model
+
+# Fit or update the model of a company on its stored history and save its next forecast.
+# Runs on local files only and raises on failure; returns the holdout errors and whether the
+# saved model was warm-started.
+@instrumentation.timed('fit', model='autoarima')
+def forecast_company(company):
+    # sktime is imported here so that runs skipped by the market-hours check never pay for it
+    from sktime.forecasting.model_selection import temporal_train_test_split
+    from sktime.forecasting.base import ForecastingHorizon
+    from sktime.performance_metrics.forecasting import mean_absolute_percentage_error, mean_squared_error, mean_absolute_error
+
+    forecast_path = os.path.join(prices_folder, f"{company}_forecast.csv")
+    model_path = os.path.join(prices_folder, f"{company}_model.joblib")
+    meta_path = os.path.join(prices_folder, f"{company}_model.json")
+
+    y = load_close_series(company)
+    
+    # Split the data into training and test sets
+    y_train, y_test = temporal_train_test_split(y, test_size=10)
+    
+    # Define the forecasting horizon
+    fh = ForecastingHorizon(y_test.index, is_relative=False)
+    
+    # Update the saved model if possible, otherwise search and train a new AutoARIMA model
+    model, meta = load_model(model_path, meta_path)
+    warm_started = can_warm_start(model, meta, y_train)
+    if warm_started:
+        model = warm_start(model, y_train)
+    else:
+        model = full_search(y_train)
+    
+    # Make predictions
+    y_pred = model.predict(fh)
+    mape = mean_absolute_percentage_error(y_test, y_pred)
+    
+    # Fall back to a full order search if the warm-started model is inaccurate or has drifted
+    if warm_started and (mape > MAX_WARM_START_MAPE or mape > meta['mape'] * MAX_WARM_START_DRIFT):
+        logger.info(f"Warm-started MAPE for {company} is {mape:.4f} (last full search: {meta['mape']:.4f}). Running a full order search.")
+        print(f"Warm-started MAPE for {company} is {mape:.4f} (last full search: {meta['mape']:.4f}). Running a full order search.")
+        model = full_search(y_train)
         y_pred = model.predict(fh)
-        
-        # Calculate and print evaluation metrics
         mape = mean_absolute_percentage_error(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        mae = mean_absolute_error(y_test, y_pred)
-        #logger.info(f"MAPE for {company}: {mape:.2f}")
-        #logger.info(f"RMSE for {company}: {rmse:.2f}")
-        #logger.info(f"MAE for {company}: {mae:.2f}")
-        # Save the forecast
-        y_pred.to_csv(forecast_path, header=True)
-        #logger.info(f"Forecast saved for {company} in {forecast_path}")
-        print(f"Forecast saved for {company} in {forecast_path}")
-
-        # Save the model
-        joblib.dump(model, model_path)
-        #logger.info(f"Model saved for {company} in {model_path}")
-        print(f"Model saved for {company} in {model_path}")
-    except Exception as e:
-        logger.error(f"Error processing {company}: {e}")
-        print(f"Error processing {company}: {e}")
+        warm_started = False
+    if not warm_started:
+        meta = {'searched_on': datetime.now().strftime("%Y-%m-%d"), 'mape': float(mape)}
+    
+    # Calculate and print evaluation metrics
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    mae = mean_absolute_error(y_test, y_pred)
+    #logger.info(f"MAPE for {company}: {mape:.2f}")
+    #logger.info(f"RMSE for {company}: {rmse:.2f}")
+    #logger.info(f"MAE for {company}: {mae:.2f}")
+    # Save the forecast of the next business day, like the fast tier. It comes from a copy
+    # updated with the holdout days; the saved model keeps its cutoff at the end of the
+    # training data so that tomorrow's run can warm-start it.
+    next_day = copy.deepcopy(model)
+    next_day.update(y_test, update_params=False)
+    next_day.predict(ForecastingHorizon([1], is_relative=True)).to_csv(forecast_path, header=True)
+    #logger.info(f"Forecast saved for {company} in {forecast_path}")
+    print(f"Forecast saved for {company} in {forecast_path}")
 
+    # Save the model
+    save_model(model, meta, model_path, meta_path)
+    #logger.info(f"Model saved for {company} in {model_path}")
+    print(f"Model saved for {company} in {model_path}")
+    return {'mape': float(mape), 'rmse': float(rmse), 'mae': float(mae), 'warm_started': warm_started}
+
+# Publish the latest forecast and last close of every company to the assistant's snapshot
+def publish_snapshot():
+    prices = {}
+    for company, symbol in company_symbols.items():
+        forecast_path = os.path.join(prices_folder, f"{company}_forecast.csv")
+        last_row = history_store.read_last_row(company)
+        if not os.path.exists(forecast_path) or last_row is None:
+            continue
+        forecast_df = pd.read_csv(forecast_path)
+        prices[company] = {
+            'symbol': symbol,
+            'predicted_price': float(forecast_df.iloc[-1, -1]),
+            'last_close': last_row['Close'],
+            'last_date': last_row['Date'].strftime("%Y-%m-%d"),
+        }
+    snapshot.publish_prices(prices)
+    logger.info(f"Published forecasts for {len(prices)} companies to {snapshot.SNAPSHOT_PATH}")
+    print(f"Published forecasts for {len(prices)} companies to {snapshot.SNAPSHOT_PATH}")
 
 # Main execution with market open check
 def main():
     if not is_market_open():
         logger.info("Market is closed. Skipping script execution.")
         print("Market is closed. Skipping script execution.")
+        publish_snapshot()
         return
     
-    # Parallel processing for faster execution
-    Parallel(n_jobs=-1)(delayed(train_and_forecast)(company, symbol) for company, symbol in company_symbols.items())
+    # Fetch on a thread pool and fit on a process pool, resuming an interrupted run of today
+    from forecast_scheduler import run_forecasts
+    for company, status, detail in run_forecasts(company_symbols):
+        logger.info(f"{company}: {status} {detail}")
+        print(f"{company}: {status} {detail}")
+    publish_snapshot()
 
 if __name__ == "__main__":
     main()
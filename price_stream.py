@@ -0,0 +1,74 @@
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two polls of the feed
+PRICE_STREAM_INTERVAL = float(os.getenv('PRICE_STREAM_INTERVAL', 15))
+
+# Local feed for tests and offline runs: serves whatever quotes were set on it
+class FakeFeed:
+    def __init__(self, quotes=None):
+        self.quotes = dict(quotes or {})
+        self.polls = 0
+
+    def set(self, symbol, price, previous_close=None):
+        self.quotes[symbol] = {'price': price, 'previous_close': previous_close}
+
+    def poll(self, symbols):
+        self.polls += 1
+        return {symbol: dict(self.quotes[symbol]) for symbol in symbols if symbol in self.quotes}
+
+# Background poller that keeps the latest price and previous close of every watched symbol
+# in memory, so that a spoken request only needs a dictionary lookup.
+# A feed is any object with a poll(symbols) method returning, per symbol,
+# a dict with 'price' and 'previous_close', such as intraday.YahooIntradayFeed.
+class PriceStreamer:
+    def __init__(self, feed, symbols, interval=PRICE_STREAM_INTERVAL):
+        self.feed = feed
+        self.symbols = list(symbols)
+        self.interval = interval
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="price-stream", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Poll the feed once and update the snapshots
+    def refresh(self):
+        quotes = self.feed.poll(self.symbols)
+        now = time.monotonic()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                self._snapshots[symbol] = dict(quote, updated_at=now)
+        return quotes
+
+    # Latest snapshot of a symbol, or None if there is none younger than max_age seconds
+    def get(self, symbol, max_age=None):
+        max_age = 3 * self.interval if max_age is None else max_age
+        with self._lock:
+            snapshot = self._snapshots.get(symbol)
+        if snapshot is None or time.monotonic() - snapshot['updated_at'] > max_age:
+            return None
+        return snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Could not poll the price feed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Quotes younger than QUOTE_CACHE_TTL seconds are served as fresh. Older quotes are still
+# served right away up to QUOTE_CACHE_STALE_TTL seconds, while a background refresh runs.
+QUOTE_CACHE_TTL = float(os.getenv('QUOTE_CACHE_TTL', 15))
+QUOTE_CACHE_STALE_TTL = float(os.getenv('QUOTE_CACHE_STALE_TTL', 300))
+QUOTE_CACHE_MAXSIZE = int(os.getenv('QUOTE_CACHE_MAXSIZE', 256))
+
+# In-process quote cache keyed by symbol, with LRU eviction and stale-while-revalidate.
+# The loader takes a list of symbols and returns a mapping of symbol to quote, so that
+# all misses of one lookup are fetched in a single batched request.
+class QuoteCache:
+    def __init__(self, loader, ttl=QUOTE_CACHE_TTL, stale_ttl=QUOTE_CACHE_STALE_TTL, maxsize=QUOTE_CACHE_MAXSIZE):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # symbol -> (quote, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    # Look up the quotes of many symbols. Raises ValueError for symbols the loader has no data for.
+    def get_many(self, symbols):
+        now = time.monotonic()
+        quotes, stale, missing = {}, [], []
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                age = now - entry[1] if entry is not None else None
+                if entry is not None and age < self.ttl:
+                    self.hits += 1
+                    quotes[symbol] = entry[0]
+                    self._entries.move_to_end(symbol)
+                elif entry is not None and age < self.stale_ttl:
+                    self.stale_hits += 1
+                    quotes[symbol] = entry[0]
+                    self._entries.move_to_end(symbol)
+                    if symbol not in self._refreshing:
+                        self._refreshing.add(symbol)
+                        stale.append(symbol)
+                else:
+                    self.misses += 1
+                    missing.append(symbol)
+
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale,), daemon=True).start()
+        if missing:
+            loaded = self._load(missing)
+            for symbol in missing:
+                if symbol not in loaded:
+                    raise ValueError(f"No data found for {symbol}")
+                quotes[symbol] = loaded[symbol]
+        return quotes
+
+    # Look up the quote of a single symbol
+    def get(self, symbol):
+        return self.get_many([symbol])[symbol]
+
+    # Store quotes fetched elsewhere, e.g. by a background poller
+    def put_many(self, quotes):
+        now = time.monotonic()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                self._entries[symbol] = (quote, now)
+                self._entries.move_to_end(symbol)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # Drop every cached quote
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Hit and miss counters
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refresh_errors': self.refresh_errors,
+                'size': len(self._entries),
+            }
+
+    def _load(self, symbols):
+        loaded = dict(self.loader(symbols))
+        self.put_many(loaded)
+        return loaded
+
+    def _refresh(self, symbols):
+        try:
+            self._load(symbols)
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Could not refresh quotes for {symbols}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(symbols)
@@ -0,0 +1,110 @@
+import threading
+import json
+import time
+import os
+import instrumentation
+import intent_parser
+
+# Compact snapshot of everything the assistant answers from: forecasts and last closes
+# published by price_pred, and headlines, summaries and an inverted index over them published
+# by news_fetch. The assistant loads it once and reloads it when the file changes, so no
+# request parses CSV or JSON files.
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'snapshot.json')
+RELOAD_CHECK_SECONDS = 1.0
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'that', 'the', 'to', 'was', 'were', 'will', 'with',
+}
+
+# Word tokens without stopwords, split the same way as the commands, so the keyword of an
+# "elaborate" command finds the headlines that contain it
+def tokenize(text):
+    return [token for token in intent_parser.tokenize(text) if token not in STOPWORDS]
+
+# Inverted index from token to [article, weight] pairs; title matches weigh more than summary matches
+def build_index(news_data):
+    index = {}
+    for i, news in enumerate(news_data):
+        weights = {}
+        for token in tokenize(news.get('summary') or ''):
+            weights[token] = 1
+        for token in tokenize(news['title']):
+            weights[token] = 2
+        for token, weight in weights.items():
+            index.setdefault(token, []).append([i, weight])
+    return index
+
+@instrumentation.timed('file_io', op='snapshot_read')
+def load_snapshot(path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# Replace one section of the snapshot, keeping the sections published by the other job
+@instrumentation.timed('file_io', op='snapshot_write')
+def _publish(sections, path=SNAPSHOT_PATH):
+    snapshot = load_snapshot(path)
+    snapshot.update(sections)
+    snapshot['updated_at'] = time.time()
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temp_path, path)
+
+# Publish forecasts as {company: {'symbol', 'predicted_price', 'last_close', 'last_date'}}
+def publish_prices(prices, path=SNAPSHOT_PATH):
+    _publish({'prices': prices}, path)
+
+# Publish headlines and summaries together with their inverted index
+def publish_news(news_data, path=SNAPSHOT_PATH):
+    news = [{'title': item['title'], 'url': item.get('url'), 'summary': item.get('summary')} for item in news_data]
+    _publish({'news': news, 'news_index': build_index(news)}, path)
+
+# Read side used by the assistant. The file's mtime is checked at most once per
+# RELOAD_CHECK_SECONDS, and the snapshot is reloaded only when it changed.
+class SnapshotReader:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._snapshot = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= RELOAD_CHECK_SECONDS:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    stat = os.stat(self.path)
+                    mtime = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    mtime = None
+                if mtime != self._mtime:
+                    try:
+                        self._snapshot = load_snapshot(self.path)
+                        self._mtime = mtime
+                    except (OSError, ValueError) as e:
+                        print(f"Could not reload the snapshot {self.path}: {e}")
+        return self._snapshot
+
+    @property
+    def prices(self):
+        return self.get().get('prices', {})
+
+    @property
+    def news(self):
+        return self.get().get('news', [])
+
+    # Articles matching a keyword phrase, best match first
+    def find_articles(self, keyword):
+        snapshot = self.get()
+        index = snapshot.get('news_index', {})
+        scores = {}
+        for token in tokenize(keyword):
+            for article, weight in index.get(token, []):
+                scores[article] = scores.get(article, 0) + weight
+        ranked = sorted(scores, key=lambda article: (-scores[article], article))
+        return [snapshot['news'][article] for article in ranked]
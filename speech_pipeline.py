@@ -0,0 +1,201 @@
+import speech_recognition as sr
+import pyttsx3
+import numpy as np
+import collections
+import threading
+import logging
+import queue
+import time
+import os
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Phrase segmentation settings for the persistent microphone stream: a frame counts as speech
+# when its energy exceeds CAPTURE_NOISE_RATIO times the running noise estimate, and a phrase
+# ends after CAPTURE_PAUSE_SECONDS of non-speech frames
+CAPTURE_NOISE_RATIO = float(os.getenv('CAPTURE_NOISE_RATIO', 2.5))
+CAPTURE_NOISE_ADAPT_RATE = float(os.getenv('CAPTURE_NOISE_ADAPT_RATE', 0.05))
+CAPTURE_MIN_ENERGY = float(os.getenv('CAPTURE_MIN_ENERGY', 100))
+CAPTURE_PAUSE_SECONDS = float(os.getenv('CAPTURE_PAUSE_SECONDS', 0.8))
+CAPTURE_PRE_ROLL_SECONDS = 0.3
+CAPTURE_MIN_PHRASE_SECONDS = 0.3
+CAPTURE_CALIBRATION_SECONDS = 0.5
+CAPTURE_MAX_PHRASE_SECONDS = float(os.getenv('CAPTURE_MAX_PHRASE_SECONDS', 10))
+
+# Text-to-speech worker. The pyttsx3 engine lives on its own thread and speaks queued
+# utterances one by one, so callers can keep fetching data while earlier sentences play.
+# interrupt() drops everything queued so far and cuts the current sentence short (barge-in).
+class SpeechWorker:
+    def __init__(self, voice_index=None):
+        self.voice_index = voice_index
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._current_generation = 0
+        self._pending = 0
+        self._busy_since = None
+        self._idle_since = time.monotonic()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+            self._thread.start()
+        return self
+
+    # Queue a sentence to be spoken
+    def say(self, text):
+        with self._lock:
+            if self._pending == 0:
+                self._busy_since = time.monotonic()
+                self._idle_since = None
+            self._pending += 1
+            self._queue.put((self._generation, text))
+
+    # Drop all queued sentences and stop the one being spoken
+    def interrupt(self):
+        with self._lock:
+            self._generation += 1
+
+    # Block until everything queued so far has been spoken
+    def wait(self):
+        self._queue.join()
+
+    # Check whether speech was playing at any time between two time.monotonic() readings
+    def speaking_during(self, start, end):
+        with self._lock:
+            if self._busy_since is None or self._busy_since > end:
+                return False
+            return self._idle_since is None or self._idle_since >= start
+
+    def _on_word(self, name, location, length):
+        if self._current_generation < self._generation:
+            self._engine.stop()
+
+    def _run(self):
+        self._engine = pyttsx3.init()
+        if self.voice_index is not None:
+            voices = self._engine.getProperty('voices')
+            self._engine.setProperty('voice', voices[self.voice_index].id)
+        self._engine.connect('started-word', self._on_word)
+
+        while True:
+            generation, text = self._queue.get()
+            try:
+                self._current_generation = generation
+                # Skip sentences queued before the last interruption
+                if generation == self._generation:
+                    with instrumentation.span('tts'):
+                        self._engine.say(text)
+                        self._engine.runAndWait()
+            except Exception as e:
+                logger.error(f"Could not speak '{text}': {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle_since = time.monotonic()
+                self._queue.task_done()
+
+# Audio-capture thread. It keeps one microphone stream open for its whole lifetime, reads
+# fixed-size frames from it and segments them into phrases with an energy threshold that
+# follows a running estimate of the background noise, so no listen pays for a fresh
+# calibration. Captured phrases are queued together with the time span they cover, and
+# every raw frame is also handed to the registered frame listeners (e.g. a wake-word detector).
+class AudioCapture:
+    def __init__(self, microphone, noise_ratio=CAPTURE_NOISE_RATIO, noise_adapt_rate=CAPTURE_NOISE_ADAPT_RATE,
+                 pause_seconds=CAPTURE_PAUSE_SECONDS, max_phrase_seconds=CAPTURE_MAX_PHRASE_SECONDS):
+        self.microphone = microphone
+        self.noise_ratio = noise_ratio
+        self.noise_adapt_rate = noise_adapt_rate
+        self.pause_seconds = pause_seconds
+        self.max_phrase_seconds = max_phrase_seconds
+        self.noise_level = None
+        self._frame_listeners = []
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # Register a callback receiving every raw frame as (frame_bytes, sample_rate, sample_width)
+    def add_frame_listener(self, callback):
+        self._frame_listeners.append(callback)
+
+    # Next captured phrase as (audio, started_at, ended_at), or None if nothing arrives within timeout
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # Current energy threshold separating speech from background noise
+    @property
+    def energy_threshold(self):
+        return max(self.noise_level * self.noise_ratio, CAPTURE_MIN_ENERGY)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.microphone as source:
+                    self._capture(source)
+            except Exception as e:
+                logger.error(f"Could not capture audio: {e}")
+                time.sleep(1)
+
+    def _capture(self, source):
+        frame_seconds = source.CHUNK / source.SAMPLE_RATE
+        pre_roll = collections.deque(maxlen=max(1, int(CAPTURE_PRE_ROLL_SECONDS / frame_seconds)))
+        phrase, speech_frames, silent_frames, started_at = None, 0, 0, None
+
+        # Calibrate once when the stream is opened; afterwards the estimate adapts in the background
+        if self.noise_level is None:
+            frames = [source.stream.read(source.CHUNK) for _ in range(max(1, int(CAPTURE_CALIBRATION_SECONDS / frame_seconds)))]
+            self.noise_level = float(np.mean([frame_energy(frame, source.SAMPLE_WIDTH) for frame in frames]))
+
+        while not self._stop.is_set():
+            frame = source.stream.read(source.CHUNK)
+            now = time.monotonic()
+            for callback in self._frame_listeners:
+                callback(frame, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+
+            energy = frame_energy(frame, source.SAMPLE_WIDTH)
+            is_speech = energy > self.energy_threshold
+
+            if phrase is None:
+                if is_speech:
+                    phrase = list(pre_roll) + [frame]
+                    started_at = now - len(phrase) * frame_seconds
+                    speech_frames, silent_frames = 1, 0
+                else:
+                    # Only background frames update the noise estimate
+                    self.noise_level += self.noise_adapt_rate * (energy - self.noise_level)
+                    pre_roll.append(frame)
+                continue
+
+            phrase.append(frame)
+            if is_speech:
+                speech_frames, silent_frames = speech_frames + 1, 0
+            else:
+                silent_frames += 1
+            if silent_frames * frame_seconds >= self.pause_seconds or len(phrase) * frame_seconds >= self.max_phrase_seconds:
+                # Short bursts such as clicks are dropped
+                if speech_frames * frame_seconds >= CAPTURE_MIN_PHRASE_SECONDS:
+                    audio = sr.AudioData(b''.join(phrase), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                    self._queue.put((audio, started_at, now))
+                phrase = None
+                pre_roll.clear()
+
+# Root-mean-square energy of a frame of signed little-endian PCM samples
+def frame_energy(frame, sample_width):
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+    samples = np.frombuffer(frame, dtype=dtype).astype(np.float64)
+    return float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
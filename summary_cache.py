@@ -0,0 +1,83 @@
+import hashlib
+import json
+import time
+import os
+import instrumentation
+
+# Persistent cache of article summaries keyed by URL. An entry is reused only while the hash
+# of the extracted article text is unchanged; it also keeps the ETag / Last-Modified
+# validators of the page so the next download can be a conditional request.
+SUMMARY_CACHE_PATH = os.path.join('news', 'summary_cache.json')
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 500))
+SUMMARY_CACHE_MAX_AGE_DAYS = float(os.getenv('SUMMARY_CACHE_MAX_AGE_DAYS', 30))
+
+# Hash of the extracted text of an article
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class SummaryCache:
+    def __init__(self, path=SUMMARY_CACHE_PATH, max_entries=SUMMARY_CACHE_MAX_ENTRIES, max_age_days=SUMMARY_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable summary cache {path}: {e}")
+
+    # ETag and Last-Modified from the last download of a URL
+    def validators(self, url):
+        entry = self.entries.get(url, {})
+        return entry.get('etag'), entry.get('last_modified')
+
+    # Cached summary of a URL, regardless of its content hash (used when the page was not modified)
+    def summary(self, url):
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        entry['used_at'] = time.time()
+        return entry['summary']
+
+    # Cached summary of a URL if it was made from the same content
+    def lookup(self, url, text_hash):
+        entry = self.entries.get(url)
+        if entry is None or entry['content_hash'] != text_hash:
+            return None
+        return self.summary(url)
+
+    def put(self, url, text_hash, summary, etag=None, last_modified=None):
+        now = time.time()
+        self.entries[url] = {
+            'content_hash': text_hash,
+            'summary': summary,
+            'etag': etag,
+            'last_modified': last_modified,
+            'created_at': now,
+            'used_at': now,
+        }
+
+    # Store the validators of a page whose content did not change
+    def update_validators(self, url, etag, last_modified):
+        if url in self.entries:
+            self.entries[url]['etag'] = etag
+            self.entries[url]['last_modified'] = last_modified
+
+    # Drop entries older than the maximum age, then the least recently used ones above the size bound
+    def evict(self):
+        cutoff = time.time() - self.max_age
+        self.entries = {url: entry for url, entry in self.entries.items() if entry['created_at'] >= cutoff}
+        if len(self.entries) > self.max_entries:
+            keep = sorted(self.entries, key=lambda url: self.entries[url]['used_at'], reverse=True)[:self.max_entries]
+            self.entries = {url: self.entries[url] for url in keep}
+
+    # Evict and write the cache atomically
+    @instrumentation.timed('file_io', op='summary_cache_write')
+    def save(self):
+        self.evict()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(self.entries, file)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,9 @@
+import tempfile
+import sys
+import os
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Keep the metrics written at exit out of the working tree
+os.environ.setdefault('METRICS_FOLDER', os.path.join(tempfile.gettempdir(), 'paige-test-metrics'))
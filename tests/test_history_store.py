@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import history_store
+
+@pytest.fixture(autouse=True)
+def prices_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, 'prices_folder', str(tmp_path))
+    return tmp_path
+
+def bars(start, closes, **columns):
+    index = pd.bdate_range(start, periods=len(closes))
+    data = {'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': [1000.0] * len(closes)}
+    data.update(columns)
+    return pd.DataFrame(data, index=index)
+
+def test_append_and_read_back():
+    assert history_store.read_last_row('Apple') is None
+    assert history_store.last_date('Apple') is None
+    assert history_store.append_history('Apple', bars('2026-10-12', [10.0, 11.0, 12.0])) == 3
+
+    history = history_store.read_history('Apple')
+    assert list(history['Close']) == [10.0, 11.0, 12.0]
+    assert list(history.index.date) == list(pd.bdate_range('2026-10-12', periods=3).date)
+    row = history_store.read_last_row('Apple')
+    assert row['Date'] == pd.Timestamp('2026-10-14')
+    assert (row['Close'], row['Volume']) == (12.0, 1000.0)
+
+def test_overlapping_bars_are_not_written_twice():
+    history_store.append_history('Apple', bars('2026-10-12', [10.0, 11.0, 12.0]))
+    assert history_store.append_history('Apple', bars('2026-10-12', [10.0, 11.0, 12.0])) == 0
+    assert history_store.append_history('Apple', bars('2026-10-09', [9.0, 10.0, 11.0])) == 0
+    assert history_store.append_history('Apple', bars('2026-10-13', [11.0, 12.0, 13.0])) == 1
+    assert list(history_store.read_history('Apple')['Close']) == [10.0, 11.0, 12.0, 13.0]
+
+def test_missing_closes_and_columns():
+    frame = bars('2026-10-12', [10.0, np.nan, 12.0]).drop(columns=['Volume'])
+    assert history_store.append_history('Apple', frame) == 2
+    assert history_store.append_history('Apple', None) == 0
+    assert np.isnan(history_store.read_last_row('Apple')['Volume'])
+
+def test_partial_trailing_record_is_ignored_and_replaced(prices_folder):
+    history_store.append_history('Apple', bars('2026-10-12', [10.0, 11.0]))
+    path = history_store.history_path('Apple')
+    # An interrupted run left half a record behind
+    with open(path, 'ab') as file:
+        file.write(b'\x01' * (history_store.HISTORY_DTYPE.itemsize // 2))
+
+    assert history_store.read_last_row('Apple')['Close'] == 11.0
+    assert list(history_store.read_history('Apple')['Close']) == [10.0, 11.0]
+
+    assert history_store.append_history('Apple', bars('2026-10-14', [12.0, 13.0])) == 2
+    assert os.path.getsize(path) == 4 * history_store.HISTORY_DTYPE.itemsize
+    assert list(history_store.read_history('Apple')['Close']) == [10.0, 11.0, 12.0, 13.0]
+
+def test_previous_close_is_the_last_session_before_the_day():
+    history_store.append_history('Apple', bars('2026-10-14', [10.0, 11.0, 12.0]))  # Wed to Fri
+    # During Friday's session, with Friday's bar already stored
+    assert history_store.read_previous_close('Apple', before='2026-10-16 11:00') == 11.0
+    # On the following Monday
+    assert history_store.read_previous_close('Apple', before='2026-10-19') == 12.0
+    assert history_store.read_previous_close('Apple', before='2026-10-14') is None
+    assert history_store.read_previous_close('Tesla', before='2026-10-16') is None
@@ -0,0 +1,69 @@
+import sys
+import os
+import pytest
+from intent_parser import IntentParser, ParsedCommand, tokenize
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from bench_intent import WATCHLIST, TRANSCRIPTS
+
+ALIASES = {"Google": ["Alphabet"], "Facebook": ["Meta"]}
+APPLE, TESLA = ("Apple", "AAPL"), ("Tesla", "TSLA")
+
+# Expected results for the benchmark's transcripts
+EXPECTED = {
+    "what is the price of apple": ParsedCommand('price', [APPLE], None),
+    "what's the price of apple and tesla": ParsedCommand('price', [APPLE, TESLA], None),
+    "predict the price of microsoft": ParsedCommand('predict', [("Microsoft", "MSFT")], None),
+    "give me the news": ParsedCommand('news', [], None),
+    "elaborate on interest rates": ParsedCommand('elaborate', [], "interest rates"),
+    "how is my portfolio doing": ParsedCommand('portfolio', [], None),
+    "price of netflx": ParsedCommand('price', [("Netflix", "NFLX")], None),
+    "what is the google stock price": ParsedCommand('price', [("Google", "GOOGL")], None),
+    "predict amazon and facebook": ParsedCommand('predict', [("Amazon", "AMZN"), ("Facebook", "META")], None),
+    "thank you": ParsedCommand('thanks', [], None),
+    "what is the a a p l price": ParsedCommand('price', [APPLE], None),
+    "what is the day range of tesla": ParsedCommand('range', [TESLA], None),
+    "how much volume did apple trade": ParsedCommand('volume', [APPLE], None),
+    "tell me about the weather": ParsedCommand('unknown', [], None),
+}
+
+@pytest.fixture(scope='module')
+def parser():
+    return IntentParser(dict(WATCHLIST, **{"AT&T": "T"}), ALIASES)
+
+def test_every_benchmark_transcript_has_an_expectation():
+    assert set(TRANSCRIPTS) == set(EXPECTED)
+
+@pytest.mark.parametrize('transcript', TRANSCRIPTS)
+def test_benchmark_transcripts(parser, transcript):
+    assert parser.parse(transcript) == EXPECTED[transcript]
+
+# The intent does not depend on the order of the trigger words
+def test_company_with_price_wins_over_news(parser):
+    assert parser.parse("news about apple price") == ParsedCommand('price', [APPLE], None)
+    assert parser.parse("apple price news") == ParsedCommand('price', [APPLE], None)
+
+def test_entities_keep_their_order_without_duplicates(parser):
+    assert parser.parse("price of tesla apple and tesla").entities == [TESLA, APPLE]
+
+def test_aliases_and_tickers(parser):
+    assert parser.parse("what is alphabet trading at").entities == [("Google", "GOOGL")]
+    assert parser.parse("price of msft and nflx").entities == [("Microsoft", "MSFT"), ("Netflix", "NFLX")]
+    assert parser.parse("what is the price of at&t").entities == [("AT&T", "T")]
+
+def test_fuzzy_names(parser):
+    assert parser.parse("price of googel").entities == [("Google", "GOOGL")]
+    assert parser.parse("price of teslaa").entities == [TESLA]
+
+# Real words close to a name are left alone
+def test_short_words_are_not_corrected(parser):
+    assert parser.parse("apply the filter to my portfolio") == ParsedCommand('portfolio', [], None)
+
+# Contractions do not leave single letters that match one-letter tickers
+def test_contractions_do_not_match_tickers(parser):
+    assert parser.parse("i don't know what the price is") == ParsedCommand('unknown', [], None)
+    assert parser.parse("i don't know the price of apple") == ParsedCommand('price', [APPLE], None)
+
+def test_elaborate_keyword_drops_possessives(parser):
+    assert parser.parse("tell me more about apple's earnings") == ParsedCommand('elaborate', [APPLE], "apple earnings")
+    assert tokenize("Tesla’s S&P listing") == ['tesla', 's&p', 'listing']
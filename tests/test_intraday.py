@@ -0,0 +1,112 @@
+from datetime import date
+import math
+import csv
+import pandas as pd
+from intraday import IntradayAggregator, ReplayFeed, PushFeed
+
+FIELDS = ['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def replay(tmp_path, rows, **kwargs):
+    path = tmp_path / 'bars.csv'
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+    return ReplayFeed(str(path), **kwargs)
+
+def drain(feed, symbols):
+    quotes = {}
+    while not feed.finished:
+        quotes = feed.poll(symbols)
+    return quotes
+
+def test_session_open_high_low_volume_vwap(tmp_path):
+    feed = replay(tmp_path, [
+        ('AAPL', '2026-10-16 09:30', 100, 101, 99, 100, 10),
+        ('AAPL', '2026-10-16 09:31', 100, 104, 100, 103, 20),
+        ('AAPL', '2026-10-16 09:32', 103, 103, 98, 99, 10),
+    ], previous_closes={'AAPL': 97.0})
+
+    quote = feed.poll(['AAPL'])['AAPL']
+    assert (quote['price'], quote['volume']) == (100, 10)
+
+    quote = drain(feed, ['AAPL'])['AAPL']
+    assert (quote['open'], quote['high'], quote['low'], quote['price']) == (100, 104, 98, 99)
+    assert quote['volume'] == 40
+    assert quote['vwap'] == (10 * 100 + 20 * (104 + 100 + 103) / 3 + 10 * (103 + 98 + 99) / 3) / 40
+    assert quote['previous_close'] == 97.0
+
+def test_revised_bar_replaces_the_previous_version(tmp_path):
+    feed = replay(tmp_path, [
+        ('AAPL', '2026-10-16 09:30', 100, 100, 100, 100, 10),
+        ('AAPL', '2026-10-16 09:31', 100, 101, 100, 101, 5),
+    ])
+    drain(feed, ['AAPL'])
+    # Yahoo sends the current minute again with its final volume
+    feed.aggregator.apply_bar('AAPL', pd.Timestamp('2026-10-16 09:31'), 100, 102, 100, 102, 8)
+    quote = feed.aggregator.get('AAPL')
+    assert (quote['price'], quote['volume']) == (102, 18)
+    assert quote['vwap'] == (10 * 100 + 8 * (102 + 100 + 102) / 3) / 18
+
+def test_older_bars_are_ignored():
+    aggregator = IntradayAggregator()
+    aggregator.apply_bar('AAPL', pd.Timestamp('2026-10-16 09:31'), 100, 100, 100, 100, 10)
+    assert not aggregator.apply_bar('AAPL', pd.Timestamp('2026-10-16 09:30'), 90, 90, 90, 90, 10)
+    quote = aggregator.get('AAPL')
+    assert (quote['price'], quote['low'], quote['volume']) == (100, 100, 10)
+
+def test_session_rollover_carries_the_last_price_as_previous_close(tmp_path):
+    feed = replay(tmp_path, [
+        ('AAPL', '2026-10-15 15:58', 100, 100, 100, 100, 10),
+        ('AAPL', '2026-10-15 15:59', 100, 101, 100, 101, 10),
+        ('AAPL', '2026-10-16 09:30', 102, 103, 102, 103, 5),
+    ])
+    feed.poll(['AAPL'])
+    feed.poll(['AAPL'])
+    # The overnight gap is skipped in one poll
+    quote = feed.poll(['AAPL'])['AAPL']
+    assert feed.finished
+    assert quote['day'] == '2026-10-16'
+    assert (quote['open'], quote['high'], quote['low'], quote['volume']) == (102, 103, 102, 5)
+    assert quote['previous_close'] == 101
+
+def test_explicit_previous_close_wins_over_the_last_price():
+    aggregator = IntradayAggregator()
+    aggregator.apply_bar('AAPL', pd.Timestamp('2026-10-15 15:59'), 100, 100, 100, 100, 10)
+    # An after-hours print is not the official close
+    aggregator.set_previous_close('AAPL', 99.5, date(2026, 10, 16))
+    aggregator.apply_bar('AAPL', pd.Timestamp('2026-10-16 09:30'), 101, 101, 101, 101, 10)
+    assert aggregator.get('AAPL')['previous_close'] == 99.5
+    # Set after the session started, it still applies to that session
+    aggregator.set_previous_close('AAPL', 99.75, date(2026, 10, 16))
+    assert aggregator.get('AAPL')['previous_close'] == 99.75
+    # but not to a session of another day
+    aggregator.set_previous_close('AAPL', 1.0, date(2026, 10, 15))
+    assert aggregator.get('AAPL')['previous_close'] == 99.75
+
+def test_missing_volume_does_not_poison_the_session(tmp_path):
+    feed = replay(tmp_path, [
+        ('AAPL', '2026-10-16 09:30', 100, 100, 100, 100, 10),
+        ('AAPL', '2026-10-16 09:31', 101, 101, 101, 101, 'nan'),
+        ('AAPL', '2026-10-16 09:32', 102, 102, 102, 102, 10),
+    ])
+    quote = drain(feed, ['AAPL'])['AAPL']
+    assert quote['volume'] == 20
+    assert quote['vwap'] == 101
+    assert quote['price'] == 102
+
+def test_push_feed_trades_update_the_session():
+    feed = PushFeed()
+    updates = []
+    feed.add_listener(lambda symbol, quote: updates.append((symbol, quote['price'])))
+    feed.set_previous_close('TSLA', 250.0, date(2026, 10, 16))
+    feed.push_trade('TSLA', '2026-10-16 09:30:01', 251.0, 100)
+    feed.push_trade('TSLA', '2026-10-16 09:30:02', 249.0, float('nan'))
+    feed.push_trade('TSLA', '2026-10-16 09:30:03', 253.0, 300)
+
+    quote = feed.poll(['TSLA'])['TSLA']
+    assert updates == [('TSLA', 251.0), ('TSLA', 249.0), ('TSLA', 253.0)]
+    assert (quote['open'], quote['high'], quote['low'], quote['price']) == (251.0, 253.0, 249.0, 253.0)
+    assert quote['volume'] == 400
+    assert math.isclose(quote['vwap'], (100 * 251.0 + 300 * 253.0) / 400)
+    assert quote['previous_close'] == 250.0
@@ -0,0 +1,49 @@
+import time
+from price_stream import PriceStreamer, FakeFeed
+
+def test_refresh_serves_polled_quotes():
+    feed = FakeFeed()
+    feed.set('AAPL', 190.0, previous_close=185.0)
+    streamer = PriceStreamer(feed, ['AAPL', 'TSLA'], interval=60)
+
+    assert streamer.get('AAPL') is None
+    streamer.refresh()
+    snapshot = streamer.get('AAPL')
+    assert (snapshot['price'], snapshot['previous_close']) == (190.0, 185.0)
+    # Symbols the feed has no quote for stay missing
+    assert streamer.get('TSLA') is None
+
+def test_refresh_replaces_older_quotes():
+    feed = FakeFeed({'AAPL': {'price': 190.0, 'previous_close': 185.0}})
+    streamer = PriceStreamer(feed, ['AAPL'], interval=60)
+    streamer.refresh()
+    feed.set('AAPL', 191.5, previous_close=185.0)
+    streamer.refresh()
+    assert streamer.get('AAPL')['price'] == 191.5
+
+def test_old_snapshots_are_not_served():
+    feed = FakeFeed({'AAPL': {'price': 190.0, 'previous_close': 185.0}})
+    streamer = PriceStreamer(feed, ['AAPL'], interval=60)
+    streamer.refresh()
+    assert streamer.get('AAPL', max_age=60) is not None
+    time.sleep(0.02)
+    assert streamer.get('AAPL', max_age=0.01) is None
+
+def test_background_thread_keeps_polling_after_errors():
+    class FlakyFeed(FakeFeed):
+        def poll(self, symbols):
+            result = super().poll(symbols)
+            if self.polls == 1:
+                raise ConnectionError("feed unavailable")
+            return result
+
+    feed = FlakyFeed({'AAPL': {'price': 190.0, 'previous_close': 185.0}})
+    streamer = PriceStreamer(feed, ['AAPL'], interval=0.01).start()
+    try:
+        deadline = time.monotonic() + 5
+        while streamer.get('AAPL') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        streamer.stop()
+    assert feed.polls >= 2
+    assert streamer.get('AAPL', max_age=60)['price'] == 190.0
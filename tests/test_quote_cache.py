@@ -0,0 +1,126 @@
+import threading
+import pytest
+import quote_cache
+from quote_cache import QuoteCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+# Loader returning a price per known symbol and recording every batch it is asked for
+class Loader:
+    def __init__(self, prices):
+        self.prices = dict(prices)
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.finished = threading.Event()
+
+    def __call__(self, symbols):
+        self.calls.append(list(symbols))
+        self.release.wait(5)
+        try:
+            return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+        finally:
+            self.finished.set()
+
+# Wait until the background refreshes of a cache have stored their result
+def wait_for_refresh(cache, timeout=5.0):
+    finished = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if not cache._refreshing:
+            return
+        finished.wait(0.01)
+    raise AssertionError("refresh did not finish")
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(quote_cache, 'time', clock)
+    return clock
+
+def test_fresh_quotes_are_served_from_the_cache(clock):
+    loader = Loader({'AAPL': 190.0, 'TSLA': 250.0})
+    cache = QuoteCache(loader, ttl=15, stale_ttl=300)
+    assert cache.get_many(['AAPL', 'TSLA']) == {'AAPL': 190.0, 'TSLA': 250.0}
+    clock.now += 10
+    loader.prices['AAPL'] = 191.0
+    assert cache.get('AAPL') == 190.0
+    # All misses of one lookup go out in one batch
+    assert loader.calls == [['AAPL', 'TSLA']]
+    assert cache.stats() == {'hits': 1, 'stale_hits': 0, 'misses': 2, 'refresh_errors': 0, 'size': 2}
+
+def test_expired_quotes_are_loaded_again(clock):
+    loader = Loader({'AAPL': 190.0})
+    cache = QuoteCache(loader, ttl=15, stale_ttl=60)
+    cache.get('AAPL')
+    clock.now += 61
+    loader.prices['AAPL'] = 192.0
+    assert cache.get('AAPL') == 192.0
+    assert loader.calls == [['AAPL'], ['AAPL']]
+    assert cache.stats()['misses'] == 2
+
+def test_stale_quotes_are_served_while_one_refresh_runs(clock):
+    loader = Loader({'AAPL': 190.0})
+    cache = QuoteCache(loader, ttl=15, stale_ttl=300)
+    cache.get('AAPL')
+    clock.now += 20
+    loader.prices['AAPL'] = 193.0
+    loader.release.clear()
+    loader.finished.clear()
+
+    # Stale lookups return the old quote at once; only the first one starts a refresh
+    assert cache.get('AAPL') == 190.0
+    assert cache.get('AAPL') == 190.0
+    loader.release.set()
+    assert loader.finished.wait(5)
+    assert loader.calls == [['AAPL'], ['AAPL']]
+    assert cache.stats()['stale_hits'] == 2
+
+    # The refreshed quote is fresh again
+    wait_for_refresh(cache)
+    assert cache.get('AAPL') == 193.0
+    assert cache.stats()['hits'] == 1
+
+def test_failed_refresh_is_counted_and_retried(clock):
+    loader = Loader({'AAPL': 190.0})
+    cache = QuoteCache(loader, ttl=15, stale_ttl=300)
+    cache.get('AAPL')
+    clock.now += 20
+
+    def failing(symbols):
+        try:
+            raise ConnectionError("feed unavailable")
+        finally:
+            loader.finished.set()
+    cache.loader = failing
+    loader.finished.clear()
+    assert cache.get('AAPL') == 190.0
+    assert loader.finished.wait(5)
+    wait_for_refresh(cache)
+    assert cache.stats()['refresh_errors'] == 1
+    assert not cache._refreshing
+
+def test_least_recently_used_quotes_are_evicted(clock):
+    loader = Loader({'AAPL': 190.0, 'TSLA': 250.0, 'MSFT': 410.0})
+    cache = QuoteCache(loader, ttl=15, stale_ttl=300, maxsize=2)
+    cache.get('AAPL')
+    cache.get('TSLA')
+    cache.get('AAPL')  # AAPL is now the most recently used
+    cache.get('MSFT')
+    assert list(cache._entries) == ['AAPL', 'MSFT']
+    cache.get('TSLA')
+    assert loader.calls[-1] == ['TSLA']
+    assert list(cache._entries) == ['MSFT', 'TSLA']
+
+def test_symbols_the_loader_has_no_data_for_raise(clock):
+    loader = Loader({'AAPL': 190.0})
+    cache = QuoteCache(loader)
+    with pytest.raises(ValueError, match="XYZ"):
+        cache.get_many(['AAPL', 'XYZ'])
+    # The quotes that were found are still cached
+    assert cache.get('AAPL') == 190.0
+    assert loader.calls == [['AAPL', 'XYZ']]
@@ -0,0 +1,28 @@
+from intent_parser import IntentParser
+import snapshot
+
+WATCHLIST = {"Apple": "AAPL", "Tesla": "TSLA"}
+
+NEWS = [
+    {'title': "Apple's earnings beat expectations", 'url': 'https://example.com/1', 'summary': None},
+    {'title': "Fed holds interest rates steady", 'url': 'https://example.com/2', 'summary': "Rates stay unchanged."},
+    {'title': "Tesla’s deliveries fall", 'url': 'https://example.com/3', 'summary': None},
+]
+
+def find(tmp_path, command):
+    path = str(tmp_path / 'snapshot.json')
+    snapshot.publish_news(NEWS, path)
+    keyword = IntentParser(WATCHLIST).parse(command).keyword
+    return [article['title'] for article in snapshot.SnapshotReader(path).find_articles(keyword)]
+
+# The keyword of an "elaborate" command must find possessive titles
+def test_parser_keyword_finds_possessive_title(tmp_path):
+    assert find(tmp_path, "elaborate on apple") == ["Apple's earnings beat expectations"]
+    assert find(tmp_path, "elaborate on apple's earnings") == ["Apple's earnings beat expectations"]
+    assert find(tmp_path, "tell me more about tesla") == ["Tesla’s deliveries fall"]
+
+def test_tokenizers_agree():
+    title = "Apple's CEO says S&P rally isn't over"
+    assert snapshot.tokenize(title) == [token for token in IntentParser(WATCHLIST).parse(f"elaborate on {title}").keyword.split()
+                                        if token not in snapshot.STOPWORDS]
+    assert 'apple' in snapshot.tokenize(title)
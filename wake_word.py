@@ -0,0 +1,193 @@
+import numpy as np
+import collections
+import logging
+import wave
+import glob
+import os
+
+logger = logging.getLogger(__name__)
+
+# Local "Hey Jarvis" spotter. Enrolment recordings of the wake phrase are kept as WAV files in
+# WAKE_WORD_TEMPLATES; incoming audio is turned into MFCC frames on the fly and the tail of a
+# ring buffer is matched against every template with subsequence DTW.
+WAKE_WORD_TEMPLATES = os.getenv('WAKE_WORD_TEMPLATES', 'wake_templates')
+WAKE_WORD_THRESHOLD = float(os.getenv('WAKE_WORD_THRESHOLD', 2.2))
+WAKE_WORD_MIN_ENERGY = float(os.getenv('WAKE_WORD_MIN_ENERGY', 300))
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400  # 25 ms
+HOP_LENGTH = 160  # 10 ms
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 13
+DETECT_EVERY = 5  # run the matcher every 5 feature frames (50 ms)
+REFRACTORY_FRAMES = 100  # ignore repeated detections within 1 s of audio
+
+# Triangular mel filterbank of shape (N_MELS, N_FFT // 2 + 1)
+def mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    filters = np.zeros((n_mels, n_fft // 2 + 1))
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            filters[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+# Orthonormal DCT-II matrix keeping coefficients 1..N_MFCC (c0 is dropped for loudness invariance)
+def dct_matrix(n_mels=N_MELS, n_mfcc=N_MFCC):
+    n = np.arange(n_mels)
+    k = np.arange(1, n_mfcc + 1)[:, None]
+    return np.sqrt(2.0 / n_mels) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels))
+
+_MEL_FILTERS = mel_filterbank()
+_DCT = dct_matrix()
+_WINDOW = np.hamming(FRAME_LENGTH)
+
+# MFCC and RMS energy of consecutive frames of a 16 kHz signal. Returns (features, energies).
+def mfcc_frames(samples):
+    count = 1 + (len(samples) - FRAME_LENGTH) // HOP_LENGTH
+    if count <= 0:
+        return np.empty((0, N_MFCC)), np.empty(0)
+    idx = np.arange(FRAME_LENGTH)[None, :] + HOP_LENGTH * np.arange(count)[:, None]
+    frames = samples[idx]
+    energies = np.sqrt(np.mean(frames ** 2, axis=1))
+    spectrum = np.abs(np.fft.rfft(frames * _WINDOW, n=N_FFT)) ** 2
+    log_mel = np.log(np.maximum(spectrum @ _MEL_FILTERS.T, 1e-10))
+    return log_mel @ _DCT.T, energies
+
+# Incremental front end: PCM chunks at any rate in, MFCC frames out
+class FeatureStream:
+    def __init__(self):
+        self._samples = np.empty(0)
+        self._last_sample = 0.0
+        self._resample_tail = np.empty(0)
+        self._resample_pos = 0.0
+
+    def process(self, samples, sample_rate):
+        samples = self._resample(np.asarray(samples, dtype=np.float64), sample_rate)
+        # Pre-emphasis, carried over chunk boundaries
+        emphasized = np.empty_like(samples)
+        if len(samples):
+            emphasized[0] = samples[0] - 0.97 * self._last_sample
+            emphasized[1:] = samples[1:] - 0.97 * samples[:-1]
+            self._last_sample = samples[-1]
+        self._samples = np.concatenate([self._samples, emphasized])
+        features, energies = mfcc_frames(self._samples)
+        self._samples = self._samples[len(features) * HOP_LENGTH:]
+        return features, energies
+
+    # Linear-interpolation resampler to 16 kHz that keeps its phase across chunks
+    def _resample(self, samples, sample_rate):
+        if sample_rate == SAMPLE_RATE:
+            return samples
+        samples = np.concatenate([self._resample_tail, samples])
+        step = sample_rate / SAMPLE_RATE
+        positions = np.arange(self._resample_pos, len(samples) - 1, step)
+        resampled = np.interp(positions, np.arange(len(samples)), samples)
+        next_pos = positions[-1] + step if len(positions) else self._resample_pos
+        self._resample_tail = samples[-1:]
+        self._resample_pos = next_pos - (len(samples) - 1)
+        return resampled
+
+# Cepstral mean and variance normalization
+def normalize(features):
+    if not len(features):
+        return features
+    return (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-8)
+
+# Subsequence DTW: cost of the best alignment of the whole template against any stretch of the
+# window that ends in one of its last `ends` frames, normalized by the template length.
+# Steps are restricted to (1,0), (1,1) and (1,2) so each template row is one vectorized update.
+def subsequence_dtw(template, window, ends=1):
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    acc = cost[0].copy()
+    for i in range(1, len(template)):
+        prev = acc
+        best = prev.copy()
+        best[1:] = np.minimum(best[1:], prev[:-1])
+        best[2:] = np.minimum(best[2:], prev[:-2])
+        acc = cost[i] + best
+    return float(acc[-ends:].min()) / len(template)
+
+# Read a mono 16-bit PCM WAV file as float samples and its sample rate
+def read_wav(path):
+    with wave.open(path, 'rb') as file:
+        sample_rate = file.getframerate()
+        channels = file.getnchannels()
+        if file.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit PCM")
+        samples = np.frombuffer(file.readframes(file.getnframes()), dtype=np.int16).astype(np.float64)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, sample_rate
+
+# MFCC templates of every WAV file in a directory
+def load_templates(directory=WAKE_WORD_TEMPLATES):
+    templates = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.wav'))):
+        samples, sample_rate = read_wav(path)
+        features, _ = FeatureStream().process(samples, sample_rate)
+        if len(features):
+            templates.append(normalize(features))
+    return templates
+
+# Streaming keyword spotter. Feed it raw PCM frames with process(); it returns True (and calls
+# on_detect) when the end of the wake phrase is heard.
+class WakeWordDetector:
+    def __init__(self, templates, threshold=WAKE_WORD_THRESHOLD, min_energy=WAKE_WORD_MIN_ENERGY, on_detect=None):
+        if not templates:
+            raise ValueError("No wake-word templates to match against")
+        self.templates = templates
+        self.threshold = threshold
+        self.min_energy = min_energy
+        self.on_detect = on_detect
+        self.best_score = np.inf
+        window = int(1.5 * max(len(template) for template in templates))
+        self._features = collections.deque(maxlen=window)
+        self._energies = collections.deque(maxlen=window)
+        self._stream = FeatureStream()
+        self._since_check = 0
+        self._frames_seen = 0
+        self._last_detection = -REFRACTORY_FRAMES
+
+    @classmethod
+    def from_directory(cls, directory=WAKE_WORD_TEMPLATES, **kwargs):
+        return cls(load_templates(directory), **kwargs)
+
+    # Signature matches AudioCapture frame listeners
+    def process(self, frame, sample_rate, sample_width=2):
+        if isinstance(frame, (bytes, bytearray)):
+            frame = np.frombuffer(frame, dtype={1: np.int8, 2: np.int16, 4: np.int32}[sample_width])
+            # Scale to the 16-bit range the thresholds are expressed in
+            frame = frame.astype(np.float64) * (2 ** 15 / 2 ** (8 * sample_width - 1))
+        features, energies = self._stream.process(frame, sample_rate)
+        self._features.extend(features)
+        self._energies.extend(energies)
+        self._since_check += len(features)
+        self._frames_seen += len(features)
+        if self._since_check < DETECT_EVERY or len(self._features) < self._features.maxlen // 2:
+            return False
+
+        ends, self._since_check = self._since_check, 0
+        # Skip matching while nothing louder than the background is in the window
+        if max(self._energies) < self.min_energy:
+            return False
+        window = normalize(np.array(self._features))
+        score = min(subsequence_dtw(template, window, ends) for template in self.templates)
+        self.best_score = min(self.best_score, score)
+        if score < self.threshold and self._frames_seen - self._last_detection > REFRACTORY_FRAMES:
+            self._last_detection = self._frames_seen
+            logger.info(f"Wake word detected (score {score:.2f})")
+            if self.on_detect is not None:
+                self.on_detect()
+            return True
+        return False
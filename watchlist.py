@@ -0,0 +1,28 @@
+import csv
+import os
+
+# Companies tracked by the batch jobs and the assistant, read from a CSV file with a
+# "company,symbol" header. The original seven companies are used when the file is missing.
+WATCHLIST_PATH = os.getenv('WATCHLIST_PATH', 'watchlist.csv')
+
+DEFAULT_WATCHLIST = {
+    "Google": "GOOGL",
+    "Apple": "AAPL",
+    "Microsoft": "MSFT",
+    "Amazon": "AMZN",
+    "Facebook": "META",
+    "Tesla": "TSLA",
+    "Netflix": "NFLX"
+}
+
+# Dictionary mapping company names to their stock symbols, in file order
+def load_watchlist(path=WATCHLIST_PATH):
+    if not os.path.exists(path):
+        return dict(DEFAULT_WATCHLIST)
+    company_symbols = {}
+    with open(path, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            company, symbol = (row.get('company') or '').strip(), (row.get('symbol') or '').strip().upper()
+            if company and symbol:
+                company_symbols[company] = symbol
+    return company_symbols